@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+
+#SERVER-SIDE AGGREGATION
+#Figures that send one marker per participant grow with the cohort: at hundreds of thousands of rows
+#the payload is megabytes and the browser stalls. These functions reduce the data on the server
+#to a fixed number of values per GDM group, so the payload only depends on the number of bins.
+
+def _bin_codes(values, bins):
+    """bin index, bin centers and bin width for numeric values (equal width bins) or categories (one bin per category)"""
+    if not pd.api.types.is_numeric_dtype(values):
+        codes, categories = pd.factorize(values, sort=True)
+        return codes, np.asarray(categories), 1.0
+    values = values.to_numpy(dtype="float64")
+    low, high = np.nanmin(values), np.nanmax(values)
+    if high > low:
+        width = (high - low) / bins
+        codes = np.clip(np.floor((values - low) / width), 0, bins - 1)
+    else:
+        #a single value, every row goes in the first bin centered on it
+        width = 0.0
+        codes = np.zeros(len(values))
+    codes = np.where(np.isnan(values), -1, codes).astype(np.int64)
+    return codes, low + (np.arange(bins) + 0.5) * width, width
+
+
+def bin_2d(data, x, y, group, bins=80):
+    """count the rows of every group in a bins x bins grid of x and y
+
+    Both variables are binned over their full range, so every group shares the same grid.
+    Returns one row per non-empty bin and group: x and y bin centers, the group and the count.
+    """
+    x_codes, x_centers, _ = _bin_codes(data[x], bins)
+    y_codes, y_centers, _ = _bin_codes(data[y], bins)
+    valid = (x_codes >= 0) & (y_codes >= 0)
+    #.array keeps categoricals, so the groups come out in category order (Non-GDM first) like the unbinned figure
+    counts = (pd.DataFrame({"group": data[group].array[valid], "x": x_codes[valid], "y": y_codes[valid]})
+              .groupby(["group", "x", "y"], observed=True, sort=True).size().reset_index(name="count"))
+    return pd.DataFrame({
+        x: x_centers[counts["x"].to_numpy()],
+        y: y_centers[counts["y"].to_numpy()],
+        group: counts["group"].to_numpy(),
+        "count": counts["count"].to_numpy(),
+    })
+
+
+def category_counts(data, var, group):
+    """count and share of every value of var within each group (a histogram with one bar per value)"""
+    if var == group:
+        #the grouping variable itself, one bar per group
+        counts = data.groupby(group, observed=True, sort=True).size().reset_index(name="count")
+        counts["density"] = 1.0
+        return counts
+    counts = data.groupby([group, var], observed=True, sort=True).size().reset_index(name="count")
+    counts["density"] = counts["count"] / counts.groupby(group, observed=True)["count"].transform("sum")
+    return counts
+
+
+def histogram_counts(data, var, group, bins=30):
+    """counts and probability density of var in equal width bins shared by every group"""
+    codes, centers, width = _bin_codes(data[var], bins)
+    valid = codes >= 0
+    counts = (pd.DataFrame({group: data[group].array[valid], "bin": codes[valid]})
+              .groupby([group, "bin"], observed=True, sort=True).size().reset_index(name="count"))
+    totals = counts.groupby(group, observed=True)["count"].transform("sum")
+    return pd.DataFrame({
+        group: counts[group],
+        var: centers[counts["bin"].to_numpy()],
+        "count": counts["count"],
+        "density": counts["count"] / totals / (width if width > 0 else 1.0),
+        "width": width if width > 0 else 1.0,
+    })
+
+
+def box_summaries(data, var, group):
+    """quartiles, whiskers and outliers of var in each group, the way plotly computes boxplots
+
+    Quartiles use linear interpolation, the whiskers end at the furthest values within 1.5 IQR of the box
+    and values beyond them are outliers.
+    Returns (stats, outliers): stats has one row per group, outliers one row per distinct outlying value
+    of each group with its count, so large cohorts with many repeated outliers stay small.
+    """
+    values = data[[group, var]].dropna(subset=[var])
+    grouped = values.groupby(group, observed=True, sort=True)[var]
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ["q1", "median", "q3"]
+    iqr = stats["q3"] - stats["q1"]
+    low = (stats["q1"] - 1.5 * iqr).reindex(values[group]).to_numpy()
+    high = (stats["q3"] + 1.5 * iqr).reindex(values[group]).to_numpy()
+    x = values[var].to_numpy(dtype="float64")
+    inside = (x >= low) & (x <= high)
+    stats["lowerfence"] = values[var].where(inside).groupby(values[group], observed=True).min()
+    stats["upperfence"] = values[var].where(inside).groupby(values[group], observed=True).max()
+    stats["count"] = grouped.size()
+    outliers = (values.loc[~inside].groupby([group, var], observed=True, sort=True).size()
+                .reset_index(name="count"))
+    return stats, outliers
+
+
+class SummaryCache:
+    """histogram and boxplot summaries of one dataset, computed once per variable on first use"""
+
+    def __init__(self, data, group):
+        self.data = data
+        self.group = group
+        self._cache = {}
+
+    def _get(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def counts(self, var):
+        return self._get(("counts", var), lambda: category_counts(self.data, var, self.group))
+
+    def histogram(self, var, bins=30):
+        return self._get(("histogram", var, bins), lambda: histogram_counts(self.data, var, self.group, bins))
+
+    def box(self, var):
+        return self._get(("box", var), lambda: box_summaries(self.data, var, self.group))
@@ -1,44 +1,178 @@
-from dash import Dash, html, dash_table, dcc, callback, Output, Input
+from dash import Dash, html, dash_table, dcc, callback, clientside_callback, ClientsideFunction, Output, Input, State, no_update
 import pandas as pd
 import numpy as np 
 import plotly.express as px
+import plotly.io as pio
 import dash_bootstrap_components as dbc
 import os
+import csv
+import io
+import threading
+from itertools import product
+from flask import Response, request, jsonify
+from figure_cache import FigureCache
+from callback_metrics import CallbackMetrics
+from correlation import CorrelationEngine
+from data_source import open_source
+from aggregation import SummaryCache, bin_2d
+from cohort_index import CohortIndex, SubsetCache
+from exploratory_data_analysis.vat_gdm_schema import apply_schema, category_labels
+from exploratory_data_analysis.vat_gdm_scoring import RiskModel
+from exploratory_data_analysis.vat_gdm_statistics import compare_groups
+from exploratory_data_analysis.vat_gdm_outliers import methods as outlier_methods, outlier_flags, outlier_scores
 
 #DATASET
-# cleaned data
-dataset= pd.read_csv("datasets/gdm_vat_data_cleaned.csv")
-
-#convert values to a more user-friendly format
-# type of delivery
-dataset["type_of_delivery"] = dataset["type_of_delivery"].map({
-    0: "Vaginal",
-    1: "C-section"
-})
-#GDM status
-dataset["gestational_dm"] = dataset["gestational_dm"].map({
-    0: "Non-GDM",
-    1: "GDM"
-})
-#ethnicity
-dataset["ethnicity"] = dataset["ethnicity"].map({
-    0:"Non-White",
-    1: "White"
-})
-
-#categorical variables
-cat_var_data = dataset[["ethnicity", "pregnancies", "type_of_delivery", "gestational_dm"]]
-
-#continuous variables + gestational_dm 
-cont_var_data = dataset[["mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat",
+# cleaned data (typed parquet written by vat_gdm_data_cleaning), set GDM_DATA_PATH to load a csv, parquet, arrow/feather or sqlite file instead
+data_source = open_source(os.environ.get("GDM_DATA_PATH", "datasets/gdm_vat_data_cleaned.parquet"))
+
+def prepare_dataset(data):
+    """convert values to a more user-friendly format (the labels of type of delivery, GDM status and ethnicity)"""
+    #assign doesn't copy the other columns, so memory-mapped arrow data stays shared between workers
+    return data.assign(**{var: data[var].map(labels) for var, labels in category_labels.items()})
+
+#COHORT FILTERS
+#the filter panel slices every figure and the statistics table, using an index of these columns (see cohort_index)
+filter_ranges = ["age", "current_gestational_age"]
+filter_categories = ["bmi_band", "ethnicity", "pregnancies", "type_of_delivery"]
+#pre-pregnancy BMI bands (WHO)
+bmi_band_edges = [-np.inf, 18.5, 25, 30, np.inf]
+bmi_band_labels = ["Underweight (<18.5)", "Normal (18.5-25)", "Overweight (25-30)", "Obese (30+)"]
+#filtered cohorts kept in memory, by filter signature
+cohort_cache_size = int(os.environ.get("GDM_COHORT_CACHE_SIZE", 32))
+
+def build_cohort(data):
+    """variable subsets and summaries used by the callbacks, for the full or a filtered dataset"""
+    #categorical variables
+    cat_var_data = data[["ethnicity", "pregnancies", "type_of_delivery", "gestational_dm"]]
+
+    #continuous variables + gestational_dm 
+    cont_var_data = data[["mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat",
+    "first_fasting_glucose","bmi_pregestational", "child_birth_weight", 
+    "gestational_age_at_birth", "current_gestational_age", "age", "gestational_dm"]]
+
+    #bin counts and boxplot summaries per GDM group, the histogram and boxplot figures only contain these
+    summaries = SummaryCache(data, "gestational_dm")
+    #the lock guards the data built on first use by cohort_item (e.g. outlier flags)
+    return {"dataset": data, "cat_var_data": cat_var_data, "cont_var_data": cont_var_data,
+            "summaries": summaries, "lock": threading.Lock()}
+
+def cohort_item(view, key, build):
+    """data of a cohort that is only built when a callback first needs it, once per cohort"""
+    with view["lock"]:
+        if key not in view:
+            view[key] = build(view)
+        return view[key]
+
+def build_outliers(view):
+    """outlier flags within each GDM group for every method, highlighted in the boxplot"""
+    cont_var_data = view["cont_var_data"]
+    cont_vars = cont_var_data.columns.drop("gestational_dm")
+    #the float64 scores only exist while the flags are computed
+    scores = outlier_scores(cont_var_data, cont_vars, group="gestational_dm")
+    return {method: outlier_flags(cont_var_data, cont_vars, method=method, scores=scores)
+            for method in outlier_methods}
+
+def build_state(dataset, version):
+    """everything the callbacks read from the dataset, as one object so a reload can swap it in a single step"""
+    full_cohort = build_cohort(dataset)
+
+    #filter index, and the filtered cohorts built from it on demand
+    bmi_band = pd.cut(dataset["bmi_pregestational"], bmi_band_edges, right=False, labels=bmi_band_labels)
+    cohort_index = CohortIndex(dataset.assign(bmi_band=bmi_band), ranges=filter_ranges, categories=filter_categories)
+    cohort_cache = SubsetCache(cohort_index, lambda mask: build_cohort(dataset.loc[mask]), maxsize=cohort_cache_size)
+    return {"version": version, "dataset": dataset, "full_cohort": full_cohort,
+            "cohort_index": cohort_index, "cohort_cache": cohort_cache}
+
+#only one request rebuilds the state when the data file changes
+reload_lock = threading.Lock()
+
+def load_dataset(only_if_changed=False):
+    """(re)load the dataset and swap in the state built from it, returns False if it was already up to date"""
+    global state
+    with reload_lock:
+        #another request may have reloaded the data while this one waited for the lock
+        if only_if_changed and not data_source.changed():
+            return False
+        dataset = prepare_dataset(apply_schema(data_source.load()))
+        state = build_state(dataset, data_source.version)
+        return True
+
+def cohort_view(cohort, current):
+    """the full cohort, or the participants matching a filter signature from the filter panel
+
+    current: the state read once at the start of the callback, so a reload can't mix old and new data
+    """
+    return current["cohort_cache"].get(cohort) if cohort else current["full_cohort"]
+
+#dropdown/checklist options, also used to warm the figure cache
+hist_options = ["histogram"]
+hist_var_options = ["ethnicity", "pregnancies", "type_of_delivery"]
+box_options = ["histogram", "boxplot"]
+box_var_options = ["mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat",
 "first_fasting_glucose","bmi_pregestational", "child_birth_weight", 
-"gestational_age_at_birth", "current_gestational_age", "age", "gestational_dm"]]
+"gestational_age_at_birth", "current_gestational_age", "age","gestational_dm"]
+scatter_x_options = ["mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat",
+"first_fasting_glucose", "child_birth_weight", "bmi_pregestational",
+"gestational_age_at_birth", "current_gestational_age", "age","gestational_dm"]
+scatter_y_options = ["mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat",
+"first_fasting_glucose", "child_birth_weight", "bmi_pregestational",
+"gestational_age_at_birth", "current_gestational_age", "age",]
+outlier_options = [{"label": "None", "value": "none"}, {"label": "Z-score (|z| > 3)", "value": "z_score"},
+                   {"label": "Robust z-score (MAD > 3.5)", "value": "mad"}, {"label": "IQR (1.5 x IQR)", "value": "iqr"}]
+statistics_columns = ["variable", "test", "statistic", "p_value", "p_adjusted", "significant",
+                      "mean_gdm", "mean_non_gdm", "median_gdm", "median_non_gdm"]
+correction_options = [{"label": "Benjamini-Hochberg", "value": "fdr_bh"}, {"label": "Holm", "value": "holm"},
+                      {"label": "Bonferroni", "value": "bonferroni"}, {"label": "None", "value": "none"}]
+heatmap_options = ["mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat",
+"first_fasting_glucose", "child_birth_weight", "bmi_pregestational",
+"gestational_age_at_birth", "current_gestational_age", "age", "pregnancies"]
+
+load_dataset()
+
+#FIGURE CACHE
+#figures are cached by callback name + data version + input values, the LRU bound covers the 2^10 heatmap checklist subsets
+#every cached callback also records its latency, payload size and cache hit/miss in callback_metrics (see /metrics),
+#the other server callbacks only record their latency (callback_metrics.timed)
+callback_metrics = CallbackMetrics()
+figure_cache = FigureCache(maxsize=int(os.environ.get("GDM_FIGURE_CACHE_SIZE", 2048)), metrics=callback_metrics,
+                           version=lambda: state["version"])
+#set GDM_WARM_CACHE=1 to build every dropdown combination at startup
+warm_cache = os.environ.get("GDM_WARM_CACHE", "0") == "1"
+
+#CLIENTSIDE MODE
+#set GDM_CLIENTSIDE=1 to ship the continuous variables to the browser once and build the
+#scatterplot and boxplot there (assets/clientside.js), so dropdown changes don't go to the server
+clientside_mode = os.environ.get("GDM_CLIENTSIDE", "0") == "1"
+
+#LARGE COHORTS
+#the scatterplot is drawn with WebGL (Scattergl) above GDM_SCATTERGL_ROWS participants,
+#and above GDM_SCATTER_BIN_ROWS the points are counted in a GDM_SCATTER_BINS x GDM_SCATTER_BINS grid per GDM group
+#on the server, so the payload doesn't grow with the cohort
+scattergl_rows = int(os.environ.get("GDM_SCATTERGL_ROWS", 5000))
+scatter_bin_rows = int(os.environ.get("GDM_SCATTER_BIN_ROWS", 100_000))
+scatter_bins = int(os.environ.get("GDM_SCATTER_BINS", 80))
+#bins of the continuous variable histograms
+histogram_bins = 30
+
+#METRICS OVERLAY
+#set GDM_METRICS_OVERLAY=1 to show a table of the callback metrics at the bottom of the page (for development)
+metrics_overlay = os.environ.get("GDM_METRICS_OVERLAY", "0") == "1"
 
 
 #Initializes the app
 app = Dash(__name__, external_stylesheets=[dbc.themes.FLATLY])
 server = app.server
 
+#HOT RELOAD
+#the data file is checked before each request, when it changes the data is reloaded
+#and the cached figures and correlations are rebuilt from the new data
+#callbacks still running on the previous state store their figures under the previous data version,
+#so clearing the cache only frees memory, those figures are never served for the new data
+@server.before_request
+def reload_data():
+    if data_source.changed() and load_dataset(only_if_changed=True):
+        figure_cache.clear()
+
 #creating cards
 #Summary of Study Card
 card_description = dbc.Card([
@@ -57,12 +191,12 @@ card_cat_var = dbc.Card([
         html.Div([
             html.Label(children='Select Graph:'),
             dcc.Dropdown(
-                options = ["histogram"], 
+                options = hist_options, 
                 value="histogram", id="hist"
                 ),
             html.Label(children='Choose a Categorical Variable:'),
             dcc.Dropdown(
-                options=["ethnicity", "pregnancies", "type_of_delivery"], 
+                options=hist_var_options, 
                 value="pregnancies", id="hist_var"),
             ]),
         ], 
@@ -73,14 +207,16 @@ card_cont_var = dbc.Card([
     html.Div([
             html.Label('Choose a Graph:'),
             dcc.Dropdown(
-                options=["histogram", "boxplot"], 
+                options=box_options, 
                 value="boxplot", id="box"),
             html.Label('Choose a Continuous Variable:'),
             dcc.Dropdown(
-                options=["mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat",
-                        "first_fasting_glucose","bmi_pregestational", "child_birth_weight", 
-                        "gestational_age_at_birth", "current_gestational_age", "age","gestational_dm"], 
+                options=box_var_options, 
                 value="first_fasting_glucose", id='box_var'),
+            html.Label('Highlight Outliers:'),
+            dcc.Dropdown(
+                options=outlier_options, 
+                value="none", id='box_outliers'),
         ]),
     ],
     body=True, color="lightgrey",
@@ -90,15 +226,11 @@ card_scatter = dbc.Card([
     html.Div([
         html.Label('Choose a Continuous X Variable:'),
         dcc.Dropdown(
-            options=["mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat",
-            "first_fasting_glucose", "child_birth_weight", "bmi_pregestational",
-            "gestational_age_at_birth", "current_gestational_age", "age","gestational_dm"], 
+            options=scatter_x_options, 
             value="bmi_pregestational", id='x1'),
         html.Label('Choose a Continuous Y Variable:'),
         dcc.Dropdown(
-            options=["mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat",
-            "first_fasting_glucose", "child_birth_weight", "bmi_pregestational",
-            "gestational_age_at_birth", "current_gestational_age", "age",], 
+            options=scatter_y_options, 
             value="first_fasting_glucose", id='y1'),
     ])
 ], body=True, color="lightgrey")
@@ -107,126 +239,424 @@ card_heatmap = dbc.Card([
     html.Div([
         html.Label('Select Variables:'),
         dcc.Checklist(
-            options=["mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat",
-            "first_fasting_glucose", "child_birth_weight", "bmi_pregestational",
-            "gestational_age_at_birth", "current_gestational_age", "age", "pregnancies"], 
-            value=["mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat",
-            "first_fasting_glucose", "child_birth_weight", "bmi_pregestational",
-            "gestational_age_at_birth", "current_gestational_age", "age", "pregnancies"], 
+            options=heatmap_options, 
+            value=heatmap_options, 
             id='heatmap-checklist'),
     ])
 ], body=True, color="lightgrey")
 
+card_statistics = dbc.Card([
+    html.Div([
+        html.Label('Multiple Testing Correction:'),
+        dcc.Dropdown(
+            options=correction_options, 
+            value="fdr_bh", id="statistics-correction"),
+        html.P("F-test, t-test (Welch's when variances differ), Mann-Whitney U, and chi-square/Fisher's exact tests comparing GDM and non-GDM groups."),
+    ])
+], body=True, color="lightgrey")
+
+#filter panel, the slider bounds and checklist options come from the data loaded when the page is served
+def filter_card(cohort_index):
+    age_min, age_max = cohort_index.range_bounds("age")
+    age_bounds = [int(np.floor(age_min)), int(np.ceil(age_max))]
+    gestational_age_min, gestational_age_max = cohort_index.range_bounds("current_gestational_age")
+    gestational_age_bounds = [float(np.floor(gestational_age_min)), float(np.ceil(gestational_age_max))]
+    return dbc.Card([
+        dbc.Row([
+            dbc.Col([
+                html.Label('Age:'),
+                dcc.RangeSlider(age_bounds[0], age_bounds[1], step=1, value=age_bounds, marks=None,
+                                tooltip={"placement": "bottom", "always_visible": True}, id="filter-age"),
+                html.Label('Gestational Age at Assessment (weeks):'),
+                dcc.RangeSlider(gestational_age_bounds[0], gestational_age_bounds[1], step=0.1,
+                                value=gestational_age_bounds, marks=None,
+                                tooltip={"placement": "bottom", "always_visible": True}, id="filter-gestational-age"),
+            ], width=4),
+            dbc.Col([
+                html.Label('Pre-pregnancy BMI:'),
+                dcc.Checklist(
+                    options=bmi_band_labels, 
+                    value=bmi_band_labels, id="filter-bmi-band"),
+                html.Label('Number of Pregnancies:'),
+                dcc.Checklist(
+                    options=cohort_index.categories("pregnancies"), 
+                    value=cohort_index.categories("pregnancies"), id="filter-pregnancies", inline=True),
+            ], width=4),
+            dbc.Col([
+                html.Label('Ethnicity:'),
+                dcc.Checklist(
+                    options=cohort_index.categories("ethnicity"), 
+                    value=cohort_index.categories("ethnicity"), id="filter-ethnicity", inline=True),
+                html.Label('Type of Delivery:'),
+                dcc.Checklist(
+                    options=cohort_index.categories("type_of_delivery"), 
+                    value=cohort_index.categories("type_of_delivery"), id="filter-delivery", inline=True),
+                html.P(id="cohort-size"),
+                #signature of the current filters, an input of every figure callback ("" for the full cohort)
+                dcc.Store(id="cohort-filter", data=""),
+            ], width=4),
+        ]),
+    ], body=True, color="lightgrey")
+
 
 #App layout
-app.layout = dbc.Container([
-    dbc.Row([
-        html.H1('Representation of Data from a Gestational Diabetes Study', className= "card-title"),
-        html.Hr()
-    ]),
-    dbc.Row([
-        card_description,
-        html.Hr()
-    ]),
-    dbc.Tabs([
-        dbc.Tab(label = "Univariate Visualizations", children = [
-            #Violin plot
-            dbc.Row([
-                dbc.Col(card_cat_var, width=3),
-                dbc.Col(dcc.Graph(figure={}, id= "controls-and-hist-graph"), width=9),
-            ],align= "center",
-            ),
-            dbc.Row([
-                dbc.Col(card_cont_var, width=3),
-                dbc.Col(dcc.Graph(figure={}, id= "controls-and-box-graph"), width=9)
-            ], align="center"),
+#built on every page load, so the filter panel matches the data after a reload
+def serve_layout():
+    layout = dbc.Container([
+        dbc.Row([
+            html.H1('Representation of Data from a Gestational Diabetes Study', className= "card-title"),
+            html.Hr()
+        ]),
+        dbc.Row([
+            card_description,
+            html.Hr()
+        ]),
+        dbc.Row([
+            filter_card(state["cohort_index"]),
+            html.Hr()
         ]),
+        dbc.Tabs([
+            dbc.Tab(label = "Univariate Visualizations", children = [
+                #Violin plot
+                dbc.Row([
+                    dbc.Col(card_cat_var, width=3),
+                    dbc.Col(dcc.Graph(figure={}, id= "controls-and-hist-graph"), width=9),
+                ],align= "center",
+                ),
+                dbc.Row([
+                    dbc.Col(card_cont_var, width=3),
+                    dbc.Col(dcc.Graph(figure={}, id= "controls-and-box-graph"), width=9)
+                ], align="center"),
+            ]),
 
-        dbc.Tab(label= "Multivariate Visualizations", children = [
-            dbc.Row([
-                dbc.Col(card_scatter, width=3),
-                dbc.Col(dcc.Graph(figure={}, id= "controls-and-scatter-graph"), width=9)
-            ], align="center"),
-            dbc.Row([
-                dbc.Col(card_heatmap, width=3),
-                dbc.Col(dcc.Graph(figure={}, id= "heatmap-graph"),width=9)
-            ], align="center")
+            dbc.Tab(label= "Multivariate Visualizations", children = [
+                dbc.Row([
+                    dbc.Col(card_scatter, width=3),
+                    dbc.Col(dcc.Graph(figure={}, id= "controls-and-scatter-graph"), width=9)
+                ], align="center"),
+                dbc.Row([
+                    dbc.Col(card_heatmap, width=3),
+                    dbc.Col(dcc.Graph(figure={}, id= "heatmap-graph"),width=9)
+                ], align="center")
+            ]),
+
+            dbc.Tab(label= "Statistics", children = [
+                dbc.Row([
+                    dbc.Col(card_statistics, width=3),
+                    dbc.Col(dash_table.DataTable(
+                        id="statistics-table",
+                        columns=[{"name": col, "id": col} for col in statistics_columns],
+                        sort_action="native",
+                        page_size=30,
+                        style_table={"overflowX": "auto"},
+                        style_data_conditional=[{"if": {"filter_query": "{significant} = true"}, "fontWeight": "bold"}],
+                    ), width=9)
+                ], align="center")
+            ])
         ])
     ])
-])
+
+    #the store starts empty and is filled by update_cont_var_store when the page loads
+    if clientside_mode:
+        layout.children.extend([
+            dcc.Store(id="cont-var-store"),
+            dcc.Store(id="cont-var-version"),
+            dcc.Interval(id="cont-var-refresh", interval=clientside_refresh),
+        ])
+
+    #callback metrics table, refreshed every 2 seconds
+    if metrics_overlay:
+        layout.children.append(html.Div([
+            dcc.Interval(id="metrics-interval", interval=2000),
+            dash_table.DataTable(
+                id="metrics-table",
+                columns=[{"name": col, "id": col} for col in
+                         ["callback", "calls", "cache_hit_rate", "mean_ms", "compute_ms", "serialize_ms", "mean_kb"]],
+                style_cell={"fontSize": 12},
+            ),
+        ], style={"position": "fixed", "bottom": 0, "right": 0, "zIndex": 1000, "opacity": 0.9, "background": "white"}))
+
+    return layout
+
+
+#continuous variables are stored in the browser as {column: [values]} for the clientside callbacks,
+#along with the plotly templates used by the server-side figures
+#the store is replaced with the filtered variables when the filters change or the data is reloaded
+#(checked every clientside_refresh milliseconds, cont-var-version holds the data version and filters it was built for)
+clientside_refresh = 30_000
+
+def clientside_store(view):
+    return {
+        "columns": view["cont_var_data"].to_dict("list"),
+        "outliers": {method: flags.to_dict("list")
+                     for method, flags in cohort_item(view, "cont_outliers", build_outliers).items()},
+        "templates": {name: pio.templates[name].to_plotly_json() for name in ["seaborn", "ggplot2"]},
+        "scattergl_rows": scattergl_rows,
+        "histogram_bins": histogram_bins,
+    }
+
+
+app.layout = serve_layout
 
 
 #CALLBACKS
+#adding callback for the filter panel
+@callback(
+    Output(component_id="cohort-filter", component_property="data"),
+    Output(component_id="cohort-size", component_property="children"),
+    Input(component_id="filter-age", component_property="value"),
+    Input(component_id="filter-bmi-band", component_property="value"),
+    Input(component_id="filter-ethnicity", component_property="value"),
+    Input(component_id="filter-pregnancies", component_property="value"),
+    Input(component_id="filter-delivery", component_property="value"),
+    Input(component_id="filter-gestational-age", component_property="value"),
+    State(component_id="filter-age", component_property="min"),
+    State(component_id="filter-age", component_property="max"),
+    State(component_id="filter-gestational-age", component_property="min"),
+    State(component_id="filter-gestational-age", component_property="max"),
+    State(component_id="filter-bmi-band", component_property="options"),
+    State(component_id="filter-ethnicity", component_property="options"),
+    State(component_id="filter-pregnancies", component_property="options"),
+    State(component_id="filter-delivery", component_property="options")
+)
+@callback_metrics.timed("update_cohort")
+def update_cohort(age, bmi_band, ethnicity, pregnancies, type_of_delivery, gestational_age,
+                  age_min, age_max, gestational_age_min, gestational_age_max,
+                  bmi_band_options, ethnicity_options, pregnancies_options, delivery_options):
+    current = state
+    #the panel shows the data of the page load, controls left at their limits don't filter,
+    #so values a reload adds beyond them are still shown
+    def slider_range(value, low, high):
+        return [None if value[0] <= low else value[0], None if value[1] >= high else value[1]]
+    def checked(value, options):
+        return None if set(options) <= set(value) else value
+    #equivalent selections give the same signature, so they share the filtered cohort and cached figures
+    cohort = current["cohort_index"].signature({
+        "age": slider_range(age, age_min, age_max),
+        "bmi_band": checked(bmi_band, bmi_band_options),
+        "ethnicity": checked(ethnicity, ethnicity_options),
+        "pregnancies": checked(pregnancies, pregnancies_options),
+        "type_of_delivery": checked(type_of_delivery, delivery_options),
+        "current_gestational_age": slider_range(gestational_age, gestational_age_min, gestational_age_max),
+    })
+    n_rows = len(cohort_view(cohort, current)["dataset"])
+    return cohort, f"Showing {n_rows} of {len(current['dataset'])} participants"
+
+def empty_figure(title, template):
+    """figure shown when no participants match the filters"""
+    fig = px.scatter(title=title, template=template)
+    fig.add_annotation(text="No participants match the filters", showarrow=False, xref="paper", yref="paper")
+    return fig
+
 #adding callback for violin plot
 @callback(
     Output(component_id="controls-and-hist-graph", component_property="figure"),
     Input(component_id='hist', component_property="value"),
-    Input(component_id='hist_var', component_property="value")
+    Input(component_id='hist_var', component_property="value"),
+    Input(component_id="cohort-filter", component_property="data")
 )
-
-def update_violin_box(violin_hist, violin_hist_var):
-    fig = px.histogram(cat_var_data, 
+@figure_cache.cached("update_violin_box")
+def update_violin_box(violin_hist, violin_hist_var, cohort=""):
+    view = cohort_view(cohort, state)
+    if view["dataset"].empty:
+        return empty_figure(f"Histogram of {violin_hist_var}", "seaborn")
+    #one bar per value, from the counts per GDM group instead of every row
+    fig = px.bar(view["summaries"].counts(violin_hist_var),
                         x=violin_hist_var, 
+                        y="density",
                         color="gestational_dm", 
                         facet_col="gestational_dm",
-                        histnorm="probability density",
+                        hover_data=["count"],
                         title=f"Histogram of {violin_hist_var}",
                         labels={"gestational_dm":"GDM Status"},
                         template="seaborn",
                     )
-    fig.update_layout(xaxis_title=f"{violin_hist_var}", yaxis_title="Probability Density")
+    fig.update_layout(xaxis_title=f"{violin_hist_var}", yaxis_title="Probability Density", bargap=0)
     return fig
 
 #adding callback for histogram and boxplot
-@callback(
-    Output(component_id="controls-and-box-graph", component_property="figure"),
-    Input(component_id='box', component_property="value"),
-    Input(component_id='box_var', component_property="value")
-)
-def update_hist_box(hist_box, hist_box_var):
-    fig = px.box(cont_var_data,
-                x=hist_box_var, 
+#registered below, either on the server or in the browser depending on clientside_mode
+@figure_cache.cached("update_hist_box")
+def update_hist_box(hist_box, hist_box_var, box_outliers="none", cohort=""):
+    view = cohort_view(cohort, state)
+    cont_var_data, summaries = view["cont_var_data"], view["summaries"]
+    if cont_var_data.empty:
+        return empty_figure(f"{'Histogram' if hist_box == 'histogram' else 'Boxplot'} of {hist_box_var}", "seaborn")
+    if hist_box == "histogram" or not pd.api.types.is_numeric_dtype(cont_var_data[hist_box_var]):
+        #bin counts per GDM group (one bar per value for categorical variables)
+        if pd.api.types.is_numeric_dtype(cont_var_data[hist_box_var]):
+            counts = summaries.histogram(hist_box_var, bins=histogram_bins)
+        else:
+            counts = summaries.counts(hist_box_var)
+        fig = px.bar(counts,
+                    x=hist_box_var,
+                    y="density",
+                    color="gestational_dm",
+                    facet_col="gestational_dm",
+                    hover_data=["count"],
+                    title=f"Histogram of {hist_box_var}",
+                    labels={"gestational_dm":"GDM Status"},
+                    template="seaborn",)
+        if "width" in counts:
+            #bars span their bin, like a histogram
+            fig.update_traces(width=counts["width"].iloc[0] if len(counts) else None)
+        fig.update_layout(xaxis_title=f"{hist_box_var}", yaxis_title="Probability Density", bargap=0)
+        return fig
+
+    #boxplots drawn from the quartiles, whiskers and outliers of each GDM group
+    stats, outliers = summaries.box(hist_box_var)
+    fig = px.box(stats.reset_index(),
+                x="median", 
                 color="gestational_dm", 
                 facet_col="gestational_dm",
                 title=f"Boxplot of {hist_box_var}",
                 labels={"gestational_dm":"GDM Status"},
                 template="seaborn",)
+    for trace in list(fig.data):
+        group_stats = stats.loc[trace.name]
+        trace.update(x=None, hovertemplate=None, q1=[group_stats["q1"]], median=[group_stats["median"]],
+                     q3=[group_stats["q3"]], lowerfence=[group_stats["lowerfence"]],
+                     upperfence=[group_stats["upperfence"]], y=[trace.y0])
+        group_outliers = outliers.loc[outliers["gestational_dm"] == trace.name]
+        fig.add_scatter(x=group_outliers[hist_box_var], y=[trace.y0] * len(group_outliers),
+                        customdata=group_outliers["count"], xaxis=trace.xaxis, yaxis=trace.yaxis,
+                        mode="markers", marker=dict(color=trace.marker.color), legendgroup=trace.legendgroup,
+                        showlegend=False, hovertemplate=f"{hist_box_var}=%{{x}}<br>count=%{{customdata}}<extra></extra>")
     fig.update_layout(xaxis_title=f"{hist_box_var}")
+    #flagged values are drawn over the box of their GDM group
+    cont_outliers = cohort_item(view, "cont_outliers", build_outliers) if box_outliers in outlier_methods else {}
+    if box_outliers in cont_outliers and hist_box_var in cont_outliers[box_outliers]:
+        flagged = cont_var_data.loc[cont_outliers[box_outliers][hist_box_var]]
+        for trace in [trace for trace in fig.data if trace.type == "box"]:
+            #one marker per distinct value
+            values = flagged.loc[flagged["gestational_dm"] == trace.name, hist_box_var].drop_duplicates()
+            fig.add_scatter(x=values, y=[trace.y0] * len(values), xaxis=trace.xaxis, yaxis=trace.yaxis,
+                            mode="markers", marker=dict(color="red", symbol="x", size=9),
+                            name=f"Outlier ({box_outliers})", legendgroup="outlier",
+                            showlegend=trace.xaxis == "x",
+                            hovertemplate=f"Outlier ({box_outliers})<br>{hist_box_var}=%{{x}}<extra></extra>")
     return fig
 
 
 #adding callback for scatterplot
-@callback(
-    Output(component_id="controls-and-scatter-graph", component_property="figure"),
-    Input(component_id='x1', component_property="value"),
-    Input(component_id='y1', component_property="value")
-)
-def update_scatter(x1, y1):
-    fig = px.scatter(cont_var_data, 
-                    x=x1,
-                    y=y1, 
-                    color="gestational_dm", 
-                    title=f"Scatterplot Depicting Relationship Between {x1} and {y1}",
-                    labels={"gestational_dm":"GDM Status"},
-                    template="ggplot2",
-                    width=900,
-                    height=500,
-                    )
+#registered below, either on the server or in the browser depending on clientside_mode
+@figure_cache.cached("update_scatter")
+def update_scatter(x1, y1, cohort=""):
+    cont_var_data = cohort_view(cohort, state)["cont_var_data"]
+    n_rows = len(cont_var_data)
+    if n_rows == 0:
+        return empty_figure(f"Scatterplot Depicting Relationship Between {x1} and {y1}", "ggplot2")
+    if n_rows > scatter_bin_rows:
+        #one marker per non-empty bin, sized by the number of participants in it
+        binned = bin_2d(cont_var_data, x1, y1, "gestational_dm", bins=scatter_bins)
+        fig = px.scatter(binned,
+                        x=x1,
+                        y=y1,
+                        color="gestational_dm",
+                        size="count",
+                        hover_data=["count"],
+                        render_mode="webgl",
+                        title=f"Scatterplot Depicting Relationship Between {x1} and {y1} ({n_rows} participants, binned)",
+                        labels={"gestational_dm":"GDM Status"},
+                        template="ggplot2",
+                        width=900,
+                        height=500,
+                        )
+    else:
+        fig = px.scatter(cont_var_data, 
+                        x=x1,
+                        y=y1, 
+                        color="gestational_dm", 
+                        render_mode="webgl" if n_rows > scattergl_rows else "svg",
+                        title=f"Scatterplot Depicting Relationship Between {x1} and {y1}",
+                        labels={"gestational_dm":"GDM Status"},
+                        template="ggplot2",
+                        width=900,
+                        height=500,
+                        )
     fig.update_layout(xaxis_title=x1, yaxis_title=y1)
 
     return fig
 
 
+#adding callback for statistics table
+@callback(
+    Output(component_id="statistics-table", component_property="data"),
+    Input(component_id="statistics-correction", component_property="value"),
+    Input(component_id="cohort-filter", component_property="data")
+)
+@figure_cache.cached("update_statistics")
+def update_statistics(correction, cohort=""):
+    data = cohort_view(cohort, state)["dataset"]
+    #the groups can only be compared if the filters keep participants with and without GDM
+    if data["gestational_dm"].nunique() < 2:
+        return []
+    results = compare_groups(data, group="gestational_dm", positive="GDM", correction=correction)
+    results = results[statistics_columns].round(4)
+    return results.to_dict("records")
+
+
+#registering boxplot and scatterplot callbacks
+if clientside_mode:
+    clientside_callback(
+        ClientsideFunction(namespace="gdm", function_name="update_hist_box"),
+        Output(component_id="controls-and-box-graph", component_property="figure"),
+        Input(component_id='box', component_property="value"),
+        Input(component_id='box_var', component_property="value"),
+        Input(component_id='box_outliers', component_property="value"),
+        Input(component_id="cont-var-store", component_property="data")
+    )
+    clientside_callback(
+        ClientsideFunction(namespace="gdm", function_name="update_scatter"),
+        Output(component_id="controls-and-scatter-graph", component_property="figure"),
+        Input(component_id='x1', component_property="value"),
+        Input(component_id='y1', component_property="value"),
+        Input(component_id="cont-var-store", component_property="data")
+    )
+    @callback(
+        Output(component_id="cont-var-store", component_property="data"),
+        Output(component_id="cont-var-version", component_property="data"),
+        Input(component_id="cohort-filter", component_property="data"),
+        Input(component_id="cont-var-refresh", component_property="n_intervals"),
+        State(component_id="cont-var-version", component_property="data")
+    )
+    @callback_metrics.timed("update_cont_var_store")
+    def update_cont_var_store(cohort, n_intervals, loaded):
+        current = state
+        #only sent again when the filters or the data changed
+        if loaded == {"version": current["version"], "cohort": cohort}:
+            return no_update, no_update
+        return clientside_store(cohort_view(cohort, current)), {"version": current["version"], "cohort": cohort}
+else:
+    callback(
+        Output(component_id="controls-and-box-graph", component_property="figure"),
+        Input(component_id='box', component_property="value"),
+        Input(component_id='box_var', component_property="value"),
+        Input(component_id='box_outliers', component_property="value"),
+        Input(component_id="cohort-filter", component_property="data")
+    )(update_hist_box)
+    callback(
+        Output(component_id="controls-and-scatter-graph", component_property="figure"),
+        Input(component_id='x1', component_property="value"),
+        Input(component_id='y1', component_property="value"),
+        Input(component_id="cohort-filter", component_property="data")
+    )(update_scatter)
+
+
 #adding callback for heatmap
 @callback(
     Output(component_id="heatmap-graph", component_property="figure"),
-    Input(component_id='heatmap-checklist', component_property="value")
+    Input(component_id='heatmap-checklist', component_property="value"),
+    Input(component_id="cohort-filter", component_property="data")
 )
-def update_heatmap(variables):
-    #create dynamic dataset so it only includes selected variables
-    corr_data = dataset[list(variables)]
-    #pearsons correlation test, to create correlation matrix for heatmap
-    corr_matrix = corr_data.corr(method = "pearson")
+@figure_cache.cached("update_heatmap")
+def update_heatmap(variables, cohort=""):
+    view = cohort_view(cohort, state)
+    #correlation matrix for every heatmap variable, computed once per cohort on first use,
+    #checklist selections are sliced from it
+    engine = cohort_item(view, "correlation_engine", lambda view: CorrelationEngine(view["dataset"], heatmap_options))
+    #pearsons correlation matrix for the selected variables, sliced from the precomputed matrix
+    corr_matrix = engine.subset(variables, method="pearson")
     #heatmap
     fig = px.imshow(corr_matrix, 
                     title="Heatmap Depicting Correlation Between Variables",
@@ -237,6 +667,81 @@ def update_heatmap(variables):
 
     return fig
 
+#warm the cache so the first request for each dropdown combination is served from memory
+if warm_cache:
+    #for the full cohort (empty filter signature), the filtered figures are built on demand
+    figure_cache.warm(update_violin_box, product(hist_options, hist_var_options, [""]))
+    if not clientside_mode:
+        figure_cache.warm(update_hist_box, product(box_options, box_var_options,
+                                                   [option["value"] for option in outlier_options], [""]))
+        figure_cache.warm(update_scatter, product(scatter_x_options, scatter_y_options, [""]))
+    figure_cache.warm(update_heatmap, [(heatmap_options, "")])
+    figure_cache.warm(update_statistics, [(option["value"], "") for option in correction_options])
+    #warming isn't user traffic
+    callback_metrics.clear()
+    figure_cache.reset_counts()
+
+#adding callback for the metrics overlay, not instrumented itself
+if metrics_overlay:
+    @callback(
+        Output(component_id="metrics-table", component_property="data"),
+        Input(component_id="metrics-interval", component_property="n_intervals")
+    )
+    def update_metrics(n_intervals):
+        return callback_metrics.summary()
+
+#METRICS
+#GET /metrics returns the callback and figure cache metrics in the Prometheus text format
+#clientside callbacks (GDM_CLIENTSIDE=1) run in the browser and aren't included
+@server.route("/metrics")
+def metrics():
+    return Response(callback_metrics.prometheus(cache=figure_cache), mimetype="text/plain; version=0.0.4")
+
+#RISK SCORING API
+#POST /api/score with one record (json object), a batch (json list of objects) or a csv file (Content-Type: text/csv)
+#returns the probability of GDM from the model saved by vat_gdm_modelling
+model_path = os.environ.get("GDM_MODEL_PATH", "models/gdm_risk_model.json")
+risk_model = RiskModel.load(model_path) if os.path.exists(model_path) else None
+
+def parse_csv_value(value):
+    """number as float, label (e.g. "C-section") as text, empty cell as None"""
+    if value is None or value.strip() == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value.strip()
+
+def parse_csv_records(text, features):
+    """csv rows as dicts of the model features, other columns (e.g. an id) are ignored like in json records"""
+    return [{var: parse_csv_value(row.get(var)) for var in features}
+            for row in csv.DictReader(io.StringIO(text))]
+
+@server.route("/api/score", methods=["POST"])
+def score():
+    if risk_model is None:
+        return jsonify({"error": f"no model artifact found at {model_path}"}), 503
+    try:
+        if request.mimetype == "text/csv":
+            records = parse_csv_records(request.get_data(as_text=True), risk_model.features)
+            single = False
+        else:
+            #malformed json gets the same json error as other bad input instead of the html 400 page
+            payload = request.get_json(force=True, silent=True)
+            if payload is None:
+                raise ValueError("request body is not valid json")
+            single = isinstance(payload, dict)
+            records = [payload] if single else payload
+            if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+                raise ValueError("expected a json object or a list of json objects")
+        risk = risk_model.score_records(records).tolist()
+    except (ValueError, TypeError) as err:
+        return jsonify({"error": str(err), "features": risk_model.features}), 400
+
+    if single:
+        return jsonify({"model_version": risk_model.model_version, "probability": risk[0]})
+    return jsonify({"model_version": risk_model.model_version, "probabilities": risk})
+
 #Run the app
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,181 @@
+// CLIENTSIDE CALLBACKS
+// Used when the app is started with GDM_CLIENTSIDE=1.
+// The continuous variables are sent to the browser once (cont-var-store) and the
+// boxplot and scatterplot are rebuilt here, mirroring the plotly express figures in app.py.
+// Outlier flags are computed on the server (store.outliers[method][variable]) and only drawn here.
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    gdm: {
+        // split the values of a column by GDM status, keeping the order groups first appear in
+        group_by_gdm: function(columns, variables) {
+            const groups = {};
+            const order = [];
+            columns["gestational_dm"].forEach(function(status, i) {
+                if (!(status in groups)) {
+                    groups[status] = {};
+                    variables.forEach(function(v) { groups[status][v] = []; });
+                    order.push(status);
+                }
+                variables.forEach(function(v) { groups[status][v].push(columns[v][i]); });
+            });
+            return {groups: groups, order: order};
+        },
+
+        // template colorway is used for the group colours like plotly express does
+        colors: function(template) {
+            return (template.layout && template.layout.colorway) || [];
+        },
+
+        // values of a variable flagged as outliers, for one GDM group
+        flagged_values: function(store, method, variable, status) {
+            const flags = store.outliers && store.outliers[method] && store.outliers[method][variable];
+            if (!flags) {
+                return null;
+            }
+            const values = [];
+            store.columns["gestational_dm"].forEach(function(s, i) {
+                if (s === status && flags[i]) {
+                    values.push(store.columns[variable][i]);
+                }
+            });
+            return values;
+        },
+
+        update_hist_box: function(hist_box, hist_box_var, box_outliers, store) {
+            if (!store || !hist_box_var) {
+                return window.dash_clientside.no_update;
+            }
+            const template = store.templates["seaborn"];
+            const colors = window.dash_clientside.gdm.colors(template);
+            const grouped = window.dash_clientside.gdm.group_by_gdm(store.columns, [hist_box_var]);
+            const n = grouped.order.length;
+            const gap = 0.02;
+            const width = (1 - gap * (n - 1)) / n;
+
+            const histogram = hist_box === "histogram";
+            const data = [];
+            const layout = {
+                template: template,
+                title: {text: (histogram ? "Histogram of " : "Boxplot of ") + hist_box_var},
+                legend: {title: {text: "GDM Status"}, tracegroupgap: 0},
+                boxmode: "group",
+                bargap: 0,
+                annotations: []
+            };
+            // one facet column per GDM group
+            grouped.order.forEach(function(status, i) {
+                const suffix = i === 0 ? "" : String(i + 1);
+                const start = i * (width + gap);
+                if (histogram) {
+                    // the browser has the raw values, plotly bins them like the server-side bars
+                    data.push({
+                        type: "histogram",
+                        x: grouped.groups[status][hist_box_var],
+                        histnorm: "probability density",
+                        nbinsx: store.histogram_bins,
+                        name: status,
+                        legendgroup: status,
+                        offsetgroup: status,
+                        marker: {color: colors[i % colors.length]},
+                        hovertemplate: "GDM Status=" + status + "<br>" + hist_box_var + "=%{x}<br>density=%{y}<extra></extra>",
+                        xaxis: "x" + suffix,
+                        yaxis: "y" + suffix
+                    });
+                } else {
+                    data.push({
+                        type: "box",
+                        orientation: "h",
+                        x: grouped.groups[status][hist_box_var],
+                        x0: " ",
+                        y0: " ",
+                        name: status,
+                        legendgroup: status,
+                        offsetgroup: status,
+                        alignmentgroup: "True",
+                        marker: {color: colors[i % colors.length]},
+                        hovertemplate: "GDM Status=" + status + "<br>" + hist_box_var + "=%{x}<extra></extra>",
+                        xaxis: "x" + suffix,
+                        yaxis: "y" + suffix
+                    });
+                    const flagged = window.dash_clientside.gdm.flagged_values(store, box_outliers, hist_box_var, status);
+                    if (flagged) {
+                        data.push({
+                            type: "scatter",
+                            mode: "markers",
+                            x: flagged,
+                            y: flagged.map(function() { return " "; }),
+                            name: "Outlier (" + box_outliers + ")",
+                            legendgroup: "outlier",
+                            showlegend: i === 0,
+                            marker: {color: "red", symbol: "x", size: 9},
+                            hovertemplate: "Outlier (" + box_outliers + ")<br>" + hist_box_var + "=%{x}<extra></extra>",
+                            xaxis: "x" + suffix,
+                            yaxis: "y" + suffix
+                        });
+                    }
+                }
+                layout["xaxis" + suffix] = {
+                    anchor: "y" + suffix,
+                    domain: [start, start + width],
+                    title: {text: hist_box_var}
+                };
+                layout["yaxis" + suffix] = {anchor: "x" + suffix, domain: [0, 1]};
+                if (histogram && i === 0) {
+                    layout.yaxis.title = {text: "Probability Density"};
+                }
+                if (i > 0) {
+                    layout["xaxis" + suffix].matches = "x";
+                    layout["yaxis" + suffix].matches = "y";
+                    layout["yaxis" + suffix].showticklabels = false;
+                }
+                layout.annotations.push({
+                    text: "GDM Status=" + status,
+                    showarrow: false,
+                    x: start + width / 2,
+                    xanchor: "center",
+                    xref: "paper",
+                    y: 1,
+                    yanchor: "bottom",
+                    yref: "paper"
+                });
+            });
+            return {data: data, layout: layout};
+        },
+
+        update_scatter: function(x1, y1, store) {
+            if (!store || !x1 || !y1) {
+                return window.dash_clientside.no_update;
+            }
+            const template = store.templates["ggplot2"];
+            const colors = window.dash_clientside.gdm.colors(template);
+            const grouped = window.dash_clientside.gdm.group_by_gdm(store.columns, [x1, y1]);
+            // WebGL above the same number of participants as the server-side scatterplot
+            const gl = store.columns["gestational_dm"].length > store.scattergl_rows;
+
+            const data = grouped.order.map(function(status, i) {
+                return {
+                    type: gl ? "scattergl" : "scatter",
+                    mode: "markers",
+                    x: grouped.groups[status][x1],
+                    y: grouped.groups[status][y1],
+                    name: status,
+                    legendgroup: status,
+                    marker: {color: colors[i % colors.length], symbol: "circle"},
+                    hovertemplate: "GDM Status=" + status + "<br>" + x1 + "=%{x}<br>" + y1 + "=%{y}<extra></extra>"
+                };
+            });
+            return {
+                data: data,
+                layout: {
+                    template: template,
+                    title: {text: "Scatterplot Depicting Relationship Between " + x1 + " and " + y1},
+                    legend: {title: {text: "GDM Status"}, tracegroupgap: 0},
+                    xaxis: {title: {text: x1}},
+                    yaxis: {title: {text: y1}},
+                    width: 900,
+                    height: 500
+                }
+            };
+        }
+    }
+});
@@ -0,0 +1,147 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from functools import wraps
+
+
+#CALLBACK METRICS
+#Records for every Dash callback how long it takes, split into building the figure (compute) and
+#converting it to json (serialization), the size of the json sent to the browser and whether it came from the figure cache.
+#Callbacks without a cached figure (e.g. the filter panel) only record their time, with the timed decorator.
+#The metrics are served in the Prometheus text format on /metrics, and as a table in the optional dev overlay.
+
+duration_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+payload_buckets = (1e3, 1e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7)
+
+
+class Histogram:
+    """cumulative bucket counts, sum and count, as in a Prometheus histogram"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        lines = []
+        for bound, count in zip([*self.buckets, "+Inf"], self.counts):
+            cumulative += count
+            le = bound if bound == "+Inf" else f"{bound:g}"
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum:.6g}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class CallbackStats:
+    """metrics of one callback"""
+
+    def __init__(self):
+        self.duration = Histogram(duration_buckets)
+        self.payload = Histogram(payload_buckets)
+        self.compute_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.cache = defaultdict(int)
+
+
+class CallbackMetrics:
+    """thread-safe metrics for every callback, keyed by callback name"""
+
+    def __init__(self, prefix="gdm"):
+        self.prefix = prefix
+        self._stats = defaultdict(CallbackStats)
+        self._lock = threading.Lock()
+
+    def observe(self, callback, duration, compute=0.0, serialize=0.0, payload_bytes=None, cache_hit=None):
+        """record one call: total seconds, seconds building/serializing the figure, json size and cache result"""
+        with self._lock:
+            stats = self._stats[callback]
+            stats.duration.observe(duration)
+            if payload_bytes is not None:
+                stats.payload.observe(payload_bytes)
+            stats.compute_seconds += compute
+            stats.serialize_seconds += serialize
+            if cache_hit is not None:
+                stats.cache["hit" if cache_hit else "miss"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+    def timed(self, name):
+        """decorator for callbacks that aren't cached, records the wall time of every call"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args):
+                start = time.perf_counter()
+                result = func(*args)
+                self.observe(name, time.perf_counter() - start)
+                return result
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """one row per callback with averages, used by the dev overlay"""
+        with self._lock:
+            rows = []
+            for name, stats in sorted(self._stats.items()):
+                calls = stats.duration.count
+                misses = stats.cache["miss"]
+                lookups = stats.cache["hit"] + misses
+                rows.append({
+                    "callback": name,
+                    "calls": calls,
+                    #None for callbacks without a figure cache
+                    "cache_hit_rate": round(stats.cache["hit"] / lookups, 3) if lookups else None,
+                    "mean_ms": round(1000 * stats.duration.sum / calls, 2) if calls else None,
+                    #compute and serialization only happen on cache misses
+                    "compute_ms": round(1000 * stats.compute_seconds / misses, 2) if misses else None,
+                    "serialize_ms": round(1000 * stats.serialize_seconds / misses, 2) if misses else None,
+                    "mean_kb": round(stats.payload.sum / stats.payload.count / 1024, 1) if stats.payload.count else None,
+                })
+            return rows
+
+    def prometheus(self, cache=None):
+        """all metrics in the Prometheus text exposition format, with the figure cache size/hits/misses if given"""
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_callback_duration_seconds Wall time of Dash callbacks, including figure cache lookups.",
+            f"# TYPE {p}_callback_duration_seconds histogram",
+        ]
+        with self._lock:
+            stats = sorted(self._stats.items())
+            for name, s in stats:
+                lines.extend(s.duration.lines(f"{p}_callback_duration_seconds", f'callback="{name}"'))
+            lines += [f"# HELP {p}_callback_compute_seconds_total Time spent building figures (cache misses).",
+                      f"# TYPE {p}_callback_compute_seconds_total counter"]
+            lines += [f'{p}_callback_compute_seconds_total{{callback="{name}"}} {s.compute_seconds:.6g}' for name, s in stats]
+            lines += [f"# HELP {p}_callback_serialize_seconds_total Time spent converting figures to json (cache misses).",
+                      f"# TYPE {p}_callback_serialize_seconds_total counter"]
+            lines += [f'{p}_callback_serialize_seconds_total{{callback="{name}"}} {s.serialize_seconds:.6g}' for name, s in stats]
+            lines += [f"# HELP {p}_callback_payload_bytes Size of the json returned by Dash callbacks.",
+                      f"# TYPE {p}_callback_payload_bytes histogram"]
+            for name, s in stats:
+                lines.extend(s.payload.lines(f"{p}_callback_payload_bytes", f'callback="{name}"'))
+            lines += [f"# HELP {p}_callback_requests_total Dash callback calls by figure cache result.",
+                      f"# TYPE {p}_callback_requests_total counter"]
+            lines += [f'{p}_callback_requests_total{{callback="{name}",cache="{result}"}} {s.cache[result]}'
+                      for name, s in stats if s.cache["hit"] + s.cache["miss"] for result in ("hit", "miss")]
+        if cache is not None:
+            lines += [f"# HELP {p}_figure_cache_entries Figures stored in the figure cache.",
+                      f"# TYPE {p}_figure_cache_entries gauge",
+                      f"{p}_figure_cache_entries {len(cache)}",
+                      f"# HELP {p}_figure_cache_hits_total Figure cache hits.",
+                      f"# TYPE {p}_figure_cache_hits_total counter",
+                      f"{p}_figure_cache_hits_total {cache.hits}",
+                      f"# HELP {p}_figure_cache_misses_total Figure cache misses.",
+                      f"# TYPE {p}_figure_cache_misses_total counter",
+                      f"{p}_figure_cache_misses_total {cache.misses}"]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,139 @@
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+#COHORT INDEX
+#The filter panel slices the cohort by ranges (e.g. age) and by sets of categories (e.g. ethnicity).
+#Scanning and comparing every column on each filter change gets slow on large cohorts, so the index is built once:
+#- range columns are kept sorted with their row numbers, a range is two binary searches and a slice of row numbers
+#- categorical columns have a bitmap per value (packed bits, 1 bit per row), a set of values is the OR of their bitmaps
+#Filters on different columns are combined with AND into one row mask.
+#A range end can be None (open), e.g. a slider left at its own limit keeps values added beyond it by a reload.
+#Filters are reduced to a canonical signature (filters that keep every row are dropped, values are sorted),
+#so equivalent selections share the cached subset and the figures cached for it.
+
+class CohortIndex:
+    """row masks for range and category filters, from sorted columns and bitmaps built once"""
+
+    def __init__(self, data, ranges=(), categories=()):
+        self.n_rows = len(data)
+        #range columns: values in ascending order (missing values last) and the row number of each value
+        self._sorted = {}
+        for col in ranges:
+            values = data[col].to_numpy(dtype="float64")
+            order = np.argsort(values, kind="stable")
+            n_valid = int(np.count_nonzero(~np.isnan(values)))
+            self._sorted[col] = (values[order][:n_valid], order)
+        #categorical columns: packed bitmap of the rows with each value
+        self._bitmaps = {}
+        for col in categories:
+            codes, uniques = pd.factorize(data[col], sort=True)
+            self._bitmaps[col] = {value: np.packbits(codes == code) for code, value in enumerate(uniques.tolist())}
+
+    def range_bounds(self, col):
+        """smallest and largest (non-missing) value of a range column"""
+        values, _ = self._sorted[col]
+        return (float(values[0]), float(values[-1])) if len(values) else (np.nan, np.nan)
+
+    def categories(self, col):
+        """values of a categorical column, sorted"""
+        return list(self._bitmaps[col])
+
+    def normalize(self, filters):
+        """filters that remove rows, with sorted values: {column: [low, high]} or {column: [values]}
+
+        range ends beyond the column's values are replaced with None (open)
+        """
+        normalized = {}
+        for col, selection in filters.items():
+            if selection is None:
+                continue
+            if col in self._sorted:
+                low, high = (None if bound is None else float(bound) for bound in selection)
+                min_value, max_value = self.range_bounds(col)
+                low = None if low is None or low <= min_value else low
+                high = None if high is None or high >= max_value else high
+                #a range over every value only drops missing values, which the figures don't show either way
+                if low is not None or high is not None:
+                    normalized[col] = [low, high]
+            elif col in self._bitmaps:
+                values = sorted(value for value in set(selection) if value in self._bitmaps[col])
+                if len(values) < len(self._bitmaps[col]):
+                    normalized[col] = values
+            else:
+                raise KeyError(f"{col} is not indexed")
+        return normalized
+
+    def signature(self, filters):
+        """canonical string of the filters, "" when they keep every row"""
+        normalized = self.normalize(filters)
+        return json.dumps(normalized, sort_keys=True, separators=(",", ":")) if normalized else ""
+
+    def _range_mask(self, col, low, high):
+        values, order = self._sorted[col]
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        stop = len(values) if high is None else np.searchsorted(values, high, side="right")
+        #only the smaller of the selected and unselected row sets is written
+        if stop - start <= self.n_rows // 2:
+            mask = np.zeros(self.n_rows, dtype=bool)
+            mask[order[start:stop]] = True
+        else:
+            mask = np.ones(self.n_rows, dtype=bool)
+            mask[order[:start]] = False
+            mask[order[stop:]] = False
+        return mask
+
+    def mask(self, filters):
+        """boolean row mask of the rows matching every filter (filters or a signature)"""
+        if isinstance(filters, str):
+            filters = json.loads(filters) if filters else {}
+        filters = self.normalize(filters)
+        bits = None
+        for col, values in filters.items():
+            if col not in self._bitmaps:
+                continue
+            selected = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+            for value in values:
+                selected |= self._bitmaps[col][value]
+            bits = selected if bits is None else bits & selected
+        mask = (np.ones(self.n_rows, dtype=bool) if bits is None
+                else np.unpackbits(bits, count=self.n_rows).astype(bool))
+        for col, (low, high) in ((col, bounds) for col, bounds in filters.items() if col in self._sorted):
+            mask &= self._range_mask(col, low, high)
+        return mask
+
+
+class SubsetCache:
+    """LRU cache of objects built from the rows matching a filter signature"""
+
+    def __init__(self, index, build, maxsize=32):
+        self.index = index
+        self.build = build
+        self.maxsize = maxsize
+        self._store = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, signature):
+        with self._lock:
+            if signature in self._store:
+                self._store.move_to_end(signature)
+                return self._store[signature]
+        #built outside the lock, two requests for a new signature may both build it
+        subset = self.build(self.index.mask(signature))
+        with self._lock:
+            self._store[signature] = subset
+            self._store.move_to_end(signature)
+            while self.maxsize is not None and len(self._store) > self.maxsize:
+                self._store.popitem(last=False)
+        return subset
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+
+    def __len__(self):
+        return len(self._store)
@@ -0,0 +1,92 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+#CORRELATION ENGINE
+#The heatmap checklist only ever selects a subset of the same variables,
+#so the full correlation matrix is computed once and each checklist selection is answered by slicing it.
+#Pearson correlation is kept as running sums/co-moments so new rows can be added without a full recompute.
+#Like pandas, every pair of variables uses the rows where both are present (pairwise deletion),
+#so the sums are kept per pair: with the presence mask P and the values X (missing values as 0)
+#the counts are P.T@P, the sums (X*P).T@P = X.T@P, the squares (X**2).T@P and the cross-products X.T@X.
+
+class CorrelationEngine:
+    """correlation matrices for a fixed set of variables, answered by slicing"""
+
+    methods = ("pearson", "spearman", "kendall")
+
+    def __init__(self, data, variables):
+        self.variables = list(variables)
+        self._index = {var: i for i, var in enumerate(self.variables)}
+        self._lock = threading.Lock()
+        #running statistics for pearson correlation, [i, j] is over the rows where both variables are present
+        k = len(self.variables)
+        self.n = 0
+        self._count = np.zeros((k, k))
+        self._sum = np.zeros((k, k))
+        self._squares = np.zeros((k, k))
+        self._products = np.zeros((k, k))
+        #values are shifted by the means of the first rows, so the sums stay small and the differences accurate
+        self._shift = None
+        #rank based methods need the raw data, they are recomputed lazily after updates
+        #no copy: the columns stay shared with data (e.g. memory-mapped arrow files), copy-on-write protects them
+        self._data = data[self.variables]
+        self._matrices = {}
+        self._update_moments(self._data)
+
+    def _update_moments(self, new_data):
+        """add the pairwise counts, sums, squares and cross-products of new rows to the running totals"""
+        values = new_data[self.variables].to_numpy(dtype=np.float64)
+        if len(values) == 0:
+            return
+        present = ~np.isnan(values)
+        if self._shift is None:
+            #columns without any value yet aren't shifted
+            self._shift = np.where(present, values, 0.0).sum(axis=0) / np.maximum(present.sum(axis=0), 1)
+        values = np.where(present, values - self._shift, 0.0)
+        mask = present.astype(np.float64)
+        self.n += len(values)
+        self._count += mask.T @ mask
+        self._sum += values.T @ mask
+        self._squares += (values ** 2).T @ mask
+        self._products += values.T @ values
+
+    def update(self, new_data):
+        """add new rows to the engine"""
+        with self._lock:
+            self._update_moments(new_data)
+            self._data = pd.concat([self._data, new_data[self.variables]], ignore_index=True)
+            #cached matrices are now stale
+            self._matrices = {}
+
+    def _pearson(self):
+        #[i, j] holds variable i over the rows shared with j, so the variances of j are the transpose
+        with np.errstate(divide="ignore", invalid="ignore"):
+            comoment = self._products - self._sum * self._sum.T / self._count
+            var = self._squares - self._sum ** 2 / self._count
+            corr = comoment / np.sqrt(var * var.T)
+        #constant variables (and pairs sharing fewer than 2 rows) have no defined correlation, like pandas
+        corr[~((var > 0) & (var.T > 0) & (self._count > 1))] = np.nan
+        corr[np.diag_indices_from(corr)] = np.where(np.diag(var) > 0, 1.0, np.nan)
+        return np.clip(corr, -1.0, 1.0)
+
+    def matrix(self, method="pearson"):
+        """full correlation matrix as a numpy array, in the order of self.variables"""
+        if method not in self.methods:
+            raise ValueError(f"method must be one of {self.methods}, got {method}")
+        with self._lock:
+            if method not in self._matrices:
+                if method == "pearson":
+                    self._matrices[method] = self._pearson()
+                else:
+                    self._matrices[method] = self._data.corr(method=method).to_numpy()
+            return self._matrices[method]
+
+    def subset(self, variables, method="pearson"):
+        """correlation matrix for the selected variables, sliced from the full matrix"""
+        variables = list(variables)
+        idx = [self._index[var] for var in variables]
+        corr = self.matrix(method)[np.ix_(idx, idx)]
+        return pd.DataFrame(corr, index=variables, columns=variables)
@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+import pandas as pd
+
+
+#DATA SOURCES
+#The dashboard used to read the cleaned csv once at import time.
+#Data sources load the cleaned dataset from csv, parquet, arrow ipc (feather) or sqlite,
+#and can be checked for changes so the app can reload the data without restarting.
+
+class DataSource:
+    """base class, subclasses implement _read()"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._data = None
+
+    def _read(self):
+        raise NotImplementedError
+
+    def _modified_time(self):
+        return os.stat(self.path).st_mtime_ns
+
+    def changed(self):
+        """True if the file was modified since it was last loaded"""
+        if self._data is None:
+            return True
+        try:
+            return self._modified_time() != self._mtime
+        except FileNotFoundError:
+            #file is being replaced, keep serving the loaded data
+            return False
+
+    def load(self):
+        """read the dataset from disk and remember when it was modified"""
+        with self._lock:
+            mtime = self._modified_time()
+            self._data = self._read()
+            self._mtime = mtime
+            return self._data
+
+    @property
+    def version(self):
+        """modification time of the loaded file, None before the first load"""
+        return self._mtime
+
+    @property
+    def data(self):
+        """currently loaded dataset, loads it on first use"""
+        if self._data is None:
+            return self.load()
+        return self._data
+
+
+class CSVSource(DataSource):
+    def _read(self):
+        return pd.read_csv(self.path)
+
+
+class ParquetSource(DataSource):
+    def _read(self):
+        return pd.read_parquet(self.path)
+
+
+class ArrowSource(DataSource):
+    """arrow ipc/feather file, memory-mapped
+
+    Numeric columns are converted to pandas without copying, so the pages are shared by the OS
+    between every gunicorn worker that maps the same file instead of each worker holding its own copy.
+    Replace the file with an atomic rename (e.g. os.replace) so workers still mapping the old file are not affected.
+    """
+
+    def _read(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.feather as feather
+        except ImportError as err:
+            raise ImportError("pyarrow is required to read arrow/feather files: pip install pyarrow") from err
+        table = feather.read_table(pa.memory_map(self.path, "r"), memory_map=True)
+        return table.to_pandas(split_blocks=True, self_destruct=False)
+
+
+class SQLiteSource(DataSource):
+    def __init__(self, path, table="gdm_vat_data_cleaned"):
+        super().__init__(path)
+        self.table = table
+
+    def _read(self):
+        with closing(sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)) as conn:
+            return pd.read_sql_query(f'SELECT * FROM "{self.table}"', conn)
+
+
+#file extensions for each data source
+source_types = {
+    ".csv": CSVSource,
+    ".parquet": ParquetSource,
+    ".pq": ParquetSource,
+    ".arrow": ArrowSource,
+    ".feather": ArrowSource,
+    ".ipc": ArrowSource,
+    ".sqlite": SQLiteSource,
+    ".sqlite3": SQLiteSource,
+    ".db": SQLiteSource,
+}
+
+
+def open_source(path, **kwargs):
+    """create the data source matching the file extension"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in source_types:
+        raise ValueError(f"unsupported data file {path}, expected one of {sorted(source_types)}")
+    return source_types[ext](path, **kwargs)
@@ -0,0 +1,158 @@
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from exploratory_data_analysis.vat_gdm_data_cleaning import ColumnMapper, conv_to_decimals, gestational_age_vars
+from exploratory_data_analysis.vat_gdm_imputation import StreamingImputer
+from exploratory_data_analysis.vat_gdm_scoring import RiskModel
+
+
+#BATCH SCORING
+#Scores a whole registry extract (raw csv or parquet) with the saved GDM risk model.
+#The file is read in chunks, each chunk gets the same cleaning transforms as the study data
+#(column names, gestational ages, imputation with saved statistics) and is scored in a worker process.
+#Scores are written as soon as each chunk is done, so memory stays bounded by the chunk size x workers.
+
+#Usage (from the repository root):
+#python -m exploratory_data_analysis.vat_gdm_batch_scoring --input extract.csv --output scores.csv --n-jobs 4
+#models/imputation_stats.json holds the imputation statistics of the study data, use --imputation-stats to pass others
+
+#Unlike the cleaning pipeline no rows are removed, every row of the input gets a score.
+
+
+def read_chunks(path, chunksize):
+    """read a csv or parquet file in chunks"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".pq"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    elif ext == ".csv":
+        yield from pd.read_csv(path, chunksize=chunksize)
+    else:
+        raise ValueError(f"unsupported input file {path}")
+
+
+def prepare_chunk(chunk, mapper, imputer):
+    """apply the cleaning transforms needed for scoring to a raw chunk"""
+    chunk = mapper.rename(chunk)
+    chunk = imputer.transform(chunk)
+    #gestational ages are only converted if they are still in the raw weeks,days format
+    for var in gestational_age_vars:
+        if var in chunk.columns and not pd.api.types.is_numeric_dtype(chunk[var]):
+            chunk[var] = conv_to_decimals(chunk, var)
+    return chunk
+
+
+#each worker process loads the model and cleaning state once
+_worker = {}
+
+def _init_worker(model_path, imputer_path, mapping_path):
+    _worker["model"] = RiskModel.load(model_path)
+    _worker["imputer"] = StreamingImputer.load(imputer_path)
+    _worker["mapper"] = ColumnMapper(mapping_path)
+    #workers only use the saved mappings, new ones are not written back to the shared file
+    _worker["mapper"].path = None
+
+
+def score_chunk(start, chunk, id_columns):
+    """score one chunk, returning the row numbers, id columns and GDM risk"""
+    prepared = prepare_chunk(chunk, _worker["mapper"], _worker["imputer"])
+    model = _worker["model"]
+    scores = pd.DataFrame({"row": np.arange(start, start + len(chunk))})
+    for col in id_columns:
+        if col in prepared.columns:
+            scores[col] = prepared[col].to_numpy()
+    scores["gdm_risk"] = model.score_frame(prepared)
+    return scores
+
+
+class ScoreWriter:
+    """append scored chunks to a csv or parquet file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.ext = os.path.splitext(path)[1].lower()
+        if self.ext not in (".csv", ".parquet", ".pq"):
+            raise ValueError(f"unsupported output file {path}")
+        self._writer = None
+        self._header = True
+
+    def write(self, scores):
+        if self.ext == ".csv":
+            scores.to_csv(self.path, index=False, mode="w" if self._header else "a", header=self._header)
+            self._header = False
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(scores, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table.cast(self._writer.schema))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def score_file(input_path, output_path, model_path, imputer_path, mapping_path=None, chunksize=100_000,
+               n_jobs=1, id_columns=("number",)):
+    """score every row of input_path and write the scores to output_path, returns the number of rows scored"""
+    initargs = (model_path, imputer_path, mapping_path)
+    writer = ScoreWriter(output_path)
+    n_rows = 0
+    try:
+        if n_jobs == 1:
+            _init_worker(*initargs)
+            for chunk in read_chunks(input_path, chunksize):
+                scores = score_chunk(n_rows, chunk, id_columns)
+                writer.write(scores)
+                n_rows += len(scores)
+            return n_rows
+
+        n_jobs = n_jobs if n_jobs > 0 else os.cpu_count()
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=initargs) as pool:
+            #at most 2 chunks per worker are in flight, results are written in input order
+            pending = deque()
+            start = 0
+            for chunk in read_chunks(input_path, chunksize):
+                pending.append(pool.submit(score_chunk, start, chunk, id_columns))
+                start += len(chunk)
+                if len(pending) >= 2 * n_jobs:
+                    scores = pending.popleft().result()
+                    writer.write(scores)
+                    n_rows += len(scores)
+            while pending:
+                scores = pending.popleft().result()
+                writer.write(scores)
+                n_rows += len(scores)
+        return n_rows
+    finally:
+        writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a registry extract with the GDM risk model.")
+    parser.add_argument("--input", required=True, help="raw csv or parquet file")
+    parser.add_argument("--output", required=True, help="csv or parquet file for the scores")
+    parser.add_argument("--model", default="models/gdm_risk_model.json", help="model artifact")
+    parser.add_argument("--imputation-stats", default="models/imputation_stats.json",
+                        help="imputation statistics saved by the cleaning pipeline (--save-imputation-stats)")
+    parser.add_argument("--column-mappings", default=None, help="column name mappings saved by the cleaning pipeline")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="rows per chunk")
+    parser.add_argument("--n-jobs", type=int, default=1, help="worker processes, -1 uses all cores")
+    parser.add_argument("--id-columns", nargs="*", default=["number"], help="columns copied to the output")
+    args = parser.parse_args(argv)
+
+    n_rows = score_file(args.input, args.output, args.model, args.imputation_stats, args.column_mappings,
+                        chunksize=args.chunksize, n_jobs=args.n_jobs, id_columns=args.id_columns)
+    print(f"Scored {n_rows} rows, saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
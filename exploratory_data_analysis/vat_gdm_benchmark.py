@@ -0,0 +1,215 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
+
+from exploratory_data_analysis.vat_gdm_batch_scoring import score_file
+from exploratory_data_analysis.vat_gdm_data_cleaning import clean_file
+from exploratory_data_analysis.vat_gdm_evaluation import evaluate_models, gdm_pipeline
+from exploratory_data_analysis.vat_gdm_schema import read_cleaned
+from exploratory_data_analysis.vat_gdm_scoring import RiskModel
+from exploratory_data_analysis.vat_gdm_synthetic import CohortModel, write_cohort
+
+
+#BENCHMARKS
+#Times the pipelines and the dashboard on synthetic cohorts (vat_gdm_synthetic) of increasing size:
+#cleaning, loading, every Dash callback (without the figure cache, plus the size of the json sent to the browser)
+#on the full and a filtered cohort, cohort filter masks, correlations, cross validation and scoring.
+#Callbacks are timed cold, on a freshly built cohort so its summaries, outlier flags and correlations are computed
+#like on the first request after a (re)load, and warm (name_warm) when only the figure is built.
+#Results are saved as json with the git commit and library versions, and can be compared with a previous
+#run to catch performance regressions between versions.
+
+#Usage (from the repository root):
+#python -m exploratory_data_analysis.vat_gdm_benchmark --rows 1000 10000 100000 --output benchmarks/current.json
+#python -m exploratory_data_analysis.vat_gdm_benchmark --rows 1000 10000 --compare benchmarks/baseline.json
+
+model_path = "models/gdm_risk_model.json"
+imputation_stats_path = "models/imputation_stats.json"
+
+
+def timed(func, *args, repeat=3, setup=None, **kwargs):
+    """best time of repeated calls (seconds) and the result of the last call
+
+    setup: called (untimed) before each call, e.g. to clear what the previous call cached
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+#filters of the filtered cohort benchmarks
+benchmark_filters = {"age": [20, 35], "ethnicity": ["White"], "pregnancies": [1, 2, 3]}
+
+
+def app_callbacks(app, cohort=""):
+    """name -> (callback without the figure cache, arguments) for every Dash callback, on a filter signature"""
+    return {
+        "callback_histogram": (app.update_violin_box.__wrapped__, ("histogram", "pregnancies", cohort)),
+        "callback_boxplot": (app.update_hist_box.__wrapped__, ("boxplot", "first_fasting_glucose", "none", cohort)),
+        "callback_boxplot_outliers": (app.update_hist_box.__wrapped__,
+                                      ("boxplot", "first_fasting_glucose", "iqr", cohort)),
+        "callback_scatter": (app.update_scatter.__wrapped__, ("bmi_pregestational", "first_fasting_glucose", cohort)),
+        "callback_heatmap": (app.update_heatmap.__wrapped__, (app.heatmap_options, cohort)),
+        "callback_statistics": (app.update_statistics.__wrapped__, ("fdr_bh", cohort)),
+    }
+
+
+def reset_cohort(app, cohort=""):
+    """replace the cohort of a filter signature with a freshly built one, without its lazily built data"""
+    if cohort:
+        app.state["cohort_cache"].clear()
+        app.state["cohort_cache"].get(cohort)
+    else:
+        app.state["full_cohort"] = app.build_cohort(app.state["dataset"])
+
+
+def benchmark_size(n_rows, workdir, model, repeat=3, seed=123, cv_folds=7, n_jobs=1):
+    """run every benchmark on a synthetic cohort of n_rows, returns a list of result dicts"""
+    import app
+    from correlation import CorrelationEngine
+    from data_source import open_source
+
+    results = []
+    def record(name, seconds, **extra):
+        results.append({"name": name, "rows": n_rows, "seconds": seconds, **extra})
+        print(f"{n_rows:>10} {name:<41} {seconds:10.4f}s")
+
+    raw_path = os.path.join(workdir, f"raw_{n_rows}.csv")
+    cleaned_path = os.path.join(workdir, f"cleaned_{n_rows}.parquet")
+    chunksize = min(n_rows, 500_000)
+    write_cohort(model, raw_path, n_rows, kind="raw", seed=seed, chunksize=chunksize)
+
+    #pipelines
+    seconds, _ = timed(clean_file, raw_path, [cleaned_path], chunksize=chunksize, repeat=1)
+    record("cleaning", seconds)
+    seconds, data = timed(read_cleaned, cleaned_path, repeat=repeat)
+    record("load_cleaned", seconds)
+
+    #dashboard, loaded like the hot reload does when the data file changes
+    app.data_source = open_source(cleaned_path)
+    seconds, _ = timed(app.load_dataset, repeat=repeat)
+    record("app_load_dataset", seconds)
+    dataset = app.state["dataset"]
+    seconds, _ = timed(CorrelationEngine, dataset, app.heatmap_options, repeat=repeat)
+    record("correlation_pearson", seconds)
+    seconds, _ = timed(lambda: CorrelationEngine(dataset, app.heatmap_options).matrix("spearman"), repeat=repeat)
+    record("correlation_spearman", seconds)
+    def record_callbacks(cohort="", suffix=""):
+        for name, (func, args) in app_callbacks(app, cohort).items():
+            seconds, figure = timed(func, *args, repeat=repeat, setup=lambda: reset_cohort(app, cohort))
+            payload = len(json.dumps(figure, cls=PlotlyJSONEncoder))
+            record(f"{name}{suffix}", seconds, payload_bytes=payload)
+            seconds, _ = timed(func, *args, repeat=repeat)
+            record(f"{name}{suffix}_warm", seconds)
+    record_callbacks()
+
+    #cohort filters: the row mask from the index, building the filtered cohort and its figures
+    cohort_index = app.state["cohort_index"]
+    cohort = cohort_index.signature(benchmark_filters)
+    seconds, _ = timed(cohort_index.mask, benchmark_filters, repeat=repeat)
+    record("cohort_mask", seconds)
+    seconds, _ = timed(lambda: app.build_cohort(dataset.loc[cohort_index.mask(cohort)]), repeat=repeat)
+    record("cohort_build", seconds)
+    record_callbacks(cohort, "_filtered")
+    app.figure_cache.clear()
+
+    #modelling and scoring
+    risk_model = RiskModel.load(model_path)
+    x, y = data[risk_model.features], data["gestational_dm"].astype(int)
+    seconds, _ = timed(evaluate_models, {"model": (x, y)}, gdm_pipeline(), cv=cv_folds, n_jobs=n_jobs, repeat=1)
+    record("cross_validation", seconds)
+    seconds, _ = timed(risk_model.score_frame, data, repeat=repeat)
+    record("score_frame", seconds)
+    scores_path = os.path.join(workdir, f"scores_{n_rows}.parquet")
+    seconds, _ = timed(score_file, raw_path, scores_path, model_path, imputation_stats_path,
+                       chunksize=chunksize, n_jobs=n_jobs, repeat=1)
+    record("batch_scoring", seconds)
+    return results
+
+
+def run_benchmarks(sizes, source="datasets/visceral_fat_study.csv", repeat=3, seed=123, workdir=None, n_jobs=1):
+    """benchmark every size, returns the report saved as json"""
+    model = CohortModel.from_csv(source)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        for n_rows in sizes:
+            results.extend(benchmark_size(n_rows, workdir, model, repeat=repeat, seed=seed, n_jobs=n_jobs))
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": {"numpy": np.__version__, "pandas": pd.__version__},
+        "repeat": repeat,
+        "seed": seed,
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance=1.2):
+    """table of current vs baseline times for the benchmarks in both reports, and the regressions"""
+    key = ["name", "rows"]
+    current = pd.DataFrame(report["results"])[key + ["seconds"]]
+    previous = pd.DataFrame(baseline["results"])[key + ["seconds"]]
+    table = current.merge(previous, on=key, suffixes=("", "_baseline"))
+    table["ratio"] = table["seconds"] / table["seconds_baseline"]
+    table["regression"] = table["ratio"] > tolerance
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipelines and the dashboard on synthetic cohorts.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10_000, 100_000], help="cohort sizes")
+    parser.add_argument("--output", default="benchmarks/benchmark.json", help="json file for the results")
+    parser.add_argument("--compare", default=None, help="previous results to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.2,
+                        help="slowdown ratio reported as a regression (exit code 1)")
+    parser.add_argument("--repeat", type=int, default=3, help="repeats of the fast benchmarks, the best time is kept")
+    parser.add_argument("--seed", type=int, default=123, help="random seed of the synthetic cohorts")
+    parser.add_argument("--n-jobs", type=int, default=1, help="workers for cross validation and batch scoring")
+    parser.add_argument("--workdir", default=None, help="keep the generated files in this directory")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.rows, repeat=args.repeat, seed=args.seed, workdir=args.workdir, n_jobs=args.n_jobs)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {len(report['results'])} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            table = compare(report, json.load(f), args.tolerance)
+        print(table.to_string(index=False))
+        if table["regression"].any():
+            print(f"{table['regression'].sum()} benchmarks are more than {args.tolerance}x slower than {args.compare}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.model_selection import StratifiedKFold
+
+from exploratory_data_analysis.vat_gdm_evaluation import evaluate_models
+from exploratory_data_analysis.vat_gdm_metrics import average_precision_rows, metrics_at_threshold, roc_auc_rows
+
+
+#CONFIDENCE INTERVALS
+#With 132 participants (17 with GDM) the mean fold AUC alone says little about how certain the results are.
+#bootstrap_ci resamples participants with replacement and recomputes the metrics from the out-of-fold
+#probabilities. Each batch of replicates is a (replicates x participants) index matrix, so all metrics
+#for a batch are computed at once, and batches run in parallel with joblib.
+#Every batch gets its own seed spawned from the main seed, so results don't depend on n_jobs.
+#repeated_cv_ci repeats the whole cross validation with different shuffled folds instead.
+
+metric_names = ["roc_auc", "average_precision", "sensitivity", "specificity"]
+
+
+def _bootstrap_batch(y_true, probas, n_replicates, seed, threshold):
+    """metrics for one batch of bootstrap replicates, for every model
+
+    probas: (models, n) out-of-fold probabilities
+    returns an array of shape (models, replicates, metrics)
+    """
+    rng = np.random.default_rng(seed)
+    n = len(y_true)
+    idx = rng.integers(0, n, size=(n_replicates, n))
+    y_boot = y_true[idx]
+
+    results = np.empty((len(probas), n_replicates, len(metric_names)))
+    for m, proba in enumerate(probas):
+        p_boot = proba[idx]
+        at_threshold = metrics_at_threshold(y_boot, p_boot, threshold)
+        results[m, :, 0] = roc_auc_rows(y_boot, p_boot)
+        results[m, :, 1] = average_precision_rows(y_boot, p_boot)
+        results[m, :, 2] = at_threshold["sensitivity"]
+        results[m, :, 3] = at_threshold["specificity"]
+    return results
+
+
+def _summarize(estimates, replicates, names, confidence):
+    """percentile confidence intervals as a tidy dataframe"""
+    alpha = (1 - confidence) / 2
+    rows = []
+    for m, name in enumerate(names):
+        for k, metric in enumerate(metric_names):
+            values = replicates[m, :, k]
+            values = values[~np.isnan(values)]
+            rows.append({
+                "model": name,
+                "metric": metric,
+                "estimate": estimates[m][k],
+                "lower": np.quantile(values, alpha) if values.size else np.nan,
+                "upper": np.quantile(values, 1 - alpha) if values.size else np.nan,
+                "std": np.std(values, ddof=1) if values.size > 1 else np.nan,
+            })
+    return pd.DataFrame(rows)
+
+
+def bootstrap_ci(y_true, probas, names=None, n_boot=2000, confidence=0.95, threshold=0.5, seed=123,
+                 batch_size=250, n_jobs=None):
+    """bootstrap confidence intervals for AUC, average precision, sensitivity and specificity
+
+    y_true: outcomes (0/1)
+    probas: out-of-fold probabilities, shape (n,) or (models, n)
+    threshold: probability cut-off for sensitivity/specificity
+    """
+    y_true = np.asarray(y_true).astype(int)
+    probas = np.atleast_2d(np.asarray(probas, dtype="float64"))
+    names = names if names is not None else list(range(len(probas)))
+
+    sizes = [batch_size] * (n_boot // batch_size) + ([n_boot % batch_size] if n_boot % batch_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    batches = Parallel(n_jobs=n_jobs)(
+        delayed(_bootstrap_batch)(y_true, probas, size, batch_seed, threshold)
+        for size, batch_seed in zip(sizes, seeds)
+    )
+    replicates = np.concatenate(batches, axis=1)
+
+    at_threshold = metrics_at_threshold(y_true, probas, threshold)
+    estimates = np.column_stack([roc_auc_rows(y_true, probas), average_precision_rows(y_true, probas),
+                                 at_threshold["sensitivity"], at_threshold["specificity"]])
+    return _summarize(estimates, replicates, names, confidence)
+
+
+def repeated_cv_ci(models, estimator, cv=7, n_repeats=20, confidence=0.95, threshold=0.5, seed=123, n_jobs=None):
+    """confidence intervals from repeating the cross validation with differently shuffled folds
+
+    models: dict of model name -> (x, y), as for evaluate_models
+    Every repeat gives one mean fold AUC/average precision and out-of-fold sensitivity/specificity per model.
+    """
+    names = list(models)
+    replicates = np.empty((len(names), n_repeats, len(metric_names)))
+    seeds = np.random.SeedSequence(seed).generate_state(n_repeats)
+    for r, repeat_seed in enumerate(seeds):
+        splitter = StratifiedKFold(n_splits=cv, shuffle=True, random_state=int(repeat_seed))
+        results = evaluate_models(models, estimator, cv=splitter, n_jobs=n_jobs)
+        for m, name in enumerate(names):
+            y = models[name][1]
+            at_threshold = metrics_at_threshold(y, results[name]["y_proba"], threshold)
+            replicates[m, r] = [results[name]["scores"]["test_roc_auc"].mean(),
+                                results[name]["scores"]["test_average_precision"].mean(),
+                                at_threshold["sensitivity"][0], at_threshold["specificity"][0]]
+    estimates = np.nanmean(replicates, axis=1)
+    return _summarize(estimates, replicates, names, confidence)
@@ -1,97 +1,230 @@
-import pandas as pd 
+import argparse
+import hashlib
+import json
+import os
+import pandas as pd
+import numpy as np
 import re
+from exploratory_data_analysis.vat_gdm_schema import CleanedWriter, read_cleaned
+from exploratory_data_analysis.vat_gdm_imputation import StreamingImputer
+from exploratory_data_analysis.vat_gdm_outliers import methods as outlier_methods, outlier_report
 
 #Background on Dataset:
 #This dataset is from a prospective cohort study by Da Silva Rocha et al.(2020) which includes 133 pregnant women with a gestational age below 20 weeks.
 #These women have visceral adipose tissue (VAT) measured using ultrasound at the periumbilical region.
 #An association between higher VAT levels and GDM diagnosis at the end of pregnancy was observed.
 
-#Dataset: https://physionet.org/content/maternal-visceral-adipose/1.0.0/ 
+#Dataset: https://physionet.org/content/maternal-visceral-adipose/1.0.0/
+
+#Usage (from the repository root):
+#python -m exploratory_data_analysis.vat_gdm_data_cleaning --input datasets/visceral_fat_study.csv --output datasets/gdm_vat_data_cleaned.parquet
+#Use --chunksize to process files that are too big to load at once.
+#Use --outlier-report outliers.csv to save the values flagged as outliers within each GDM group (rows are kept).
 
-data = pd.read_csv('visceral_fat_study.csv')
-data.head()
-for col in data.columns:
-    print(col)
-data_copy = data
 
 #DATA CLEANING
-#Changing column names 
-#Using regular expression to remove unit measurements at the end of names 
-#Using rstrip to add an underscore to replace spaces and to remove trailing underscores
-col_names = []
-for col in data_copy.columns:
-    x = re.findall(r"\([\w]+\)| \([\w]+[/][\w]+\)", col)
-    if len(x) ==0:
-        col_names.append(col.replace(" ", "_"))
-    else:
-        col = col.rstrip(str(x)).replace(" ", "_").rstrip("_")
-        col_names.append(col)
-
-#Adding the new column names
-data_copy.columns = col_names
-data_copy
-
-
-#Checking for Missing Values
-data.isnull().sum()
-#Missing Values: 1 for ethnicity, 5 for pregnancies, 30 for fasting glucose, 1 for pregestational bmi 
+#Changing column names
+#Using regular expression to remove unit measurements at the end of names, e.g. "age (years)" or "bmi pregestational (kg/m)"
+#Spaces are replaced with underscores
+unit_pattern = re.compile(r"\s*\([\w/]+\)\s*$")
+space_pattern = re.compile(r"\s+")
+
+def clean_column_names(columns):
+    """remove units from column names and replace spaces with underscores"""
+    names = pd.Index(columns).astype(str)
+    names = names.str.replace(unit_pattern, "", regex=True).str.strip().str.replace(space_pattern, "_", regex=True)
+    return list(names)
+
+
+class ColumnMapper:
+    """raw -> clean column name mappings, computed once per source schema
+
+    Mappings are keyed by the raw column names, so files exported with the same columns reuse the same mapping.
+    If a json path is given the mappings are saved there and reused by later runs.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.mappings = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.mappings = json.load(f)
+
+    @staticmethod
+    def schema_key(columns):
+        return hashlib.sha1("\x1f".join(map(str, columns)).encode()).hexdigest()
+
+    def mapping(self, columns):
+        """raw -> clean names for these columns"""
+        key = self.schema_key(columns)
+        if key not in self.mappings:
+            clean = clean_column_names(columns)
+            duplicates = sorted({name for name in clean if clean.count(name) > 1})
+            if duplicates:
+                raise ValueError(f"different columns have the same clean name: {duplicates}")
+            self.mappings[key] = dict(zip(map(str, columns), clean))
+            self.save()
+        return self.mappings[key]
+
+    def rename(self, data):
+        """rename the columns of a dataframe"""
+        return data.rename(columns=self.mapping(data.columns))
+
+    def save(self):
+        if self.path is not None:
+            with open(self.path, "w") as f:
+                json.dump(self.mappings, f, indent=2)
+
+#mappings are kept in memory by default, so chunks of the same file are renamed without running the regex again
+column_mapper = ColumnMapper()
+
+
+#Missing Values: 1 for ethnicity, 5 for pregnancies, 30 for fasting glucose, 1 for pregestational bmi
 
 #Handling Missing Values:
 #Dataset is already small so I don't want to remove rows.
 #For first fasting glucose and pregestational bmi, the null values will be replaced with the mean.
 #For ethnicity and number of pregnancies, they will be converted to the mode
+#The statistics are accumulated chunk by chunk (see vat_gdm_imputation) so large files can be cleaned in chunks.
+impute_mode = ["ethnicity", "pregnancies"]
+impute_mean = ["first_fasting_glucose", "bmi_pregestational"]
 
-replace_na = { "ethnicity":data["ethnicity"].mode(), "pregnancies": data["pregnancies"].mode().iloc[0], "first_fasting_glucose":data["first_fasting_glucose"].mean(),"bmi_pregestational": data["bmi_pregestational"].mean()}
-for col, value in replace_na.items():
-    data_copy[col].fillna(value, inplace=True)
-data_copy.isnull().sum()
+def new_imputer():
+    """imputer for the columns with missing values"""
+    return StreamingImputer(mean_columns=impute_mean, mode_columns=impute_mode)
 
 
 #Fix current gestational age  and gestational age at birth columns
 #currently the columns are in a weeks,days format - e.g 12,1
 #convert it to a decimal and round the value to 1 decimal place
-
-
-data_copy.head()
+gestational_age_vars = ["current_gestational_age", "gestational_age_at_birth"]
 
 def conv_to_decimals(data, variable):
-    new_value = []
-    for row in data[variable]:
-        weeks,days=row.split(",")
-        #convert to total days
-        new_value.append(round((int(weeks)*7 + int(days))/7,1))
+    """convert "weeks,days" values to weeks as a decimal, rounded to 1 decimal place
+
+    Values that are not in a weeks,days format (or have more than 6 days) become NaN and are reported.
+    """
+    #split every value into weeks and days at once instead of looping over rows
+    parts = data[variable].astype("string").str.strip().str.extract(r"^(\d+)\s*,\s*(\d+)$")
+    weeks = pd.to_numeric(parts[0]).to_numpy(dtype="float64")
+    days = pd.to_numeric(parts[1]).to_numpy(dtype="float64")
+
+    malformed = np.isnan(weeks) | (days > 6)
+    if malformed.any():
+        print(f"{variable}: {malformed.sum()} malformed weeks,days values at rows {list(data.index[malformed])}")
+
+    #convert to total days, then to weeks
+    new_value = np.round((weeks*7 + days)/7, 1)
+    new_value[malformed] = np.nan
     return new_value
 
-new_current_gest_age = conv_to_decimals(data_copy,"current_gestational_age")
-new_ges_age_birth = conv_to_decimals(data_copy,"gestational_age_at_birth")
-
-data_copy["current_gestational_age"] = new_current_gest_age
-data_copy["gestational_age_at_birth"] = new_ges_age_birth
-
-#confirmed that it is now in a decimal format:
-data_copy[["gestational_age_at_birth", "current_gestational_age"]].head()
+def convert_gestational_ages(data):
+    """convert both gestational age columns to decimal weeks"""
+    return data.assign(**{var: conv_to_decimals(data, var) for var in gestational_age_vars})
 
 
 #IDENTIFYING INDIVIDUALS WITH DIABETES MELLITUS
-dm_cases = data_copy.loc[data_copy["diabetes_mellitus"]==1]
-
-#Removing participant with diabetes mellitus
-data_copy = data_copy.drop([119], axis=0)
-
-#There is one case of diabetes mellitus (DM) in the GDM group. 
+#There is one case of diabetes mellitus (DM) in the GDM group.
 #I have removed this individual since having pre-existing diabetes could influence the results.
 #Study is looking at using visceral fat content to predict GDM
-#If an individual already has diabetes, it impact the findings. 
-
-#REMOVING DIABETES_MELLITUS COLUMN
-data_copy = data_copy.drop("diabetes_mellitus", axis=1)
-
-#No more DM cases so dropping the column.
-
-
-#SUMMARY STATISTICS
-round(data_copy.describe(),2)
-
-#Save new dataset with clean data
-data_copy.to_csv("gdm_vat_data_cleaned.csv", index=False)
-
+#If an individual already has diabetes, it impact the findings.
+def exclude_diabetes_mellitus(data):
+    """remove participants with pre-existing diabetes mellitus and the diabetes_mellitus column"""
+    data = data.loc[data["diabetes_mellitus"] != 1]
+    #No more DM cases so dropping the column.
+    return data.drop("diabetes_mellitus", axis=1)
+
+
+def clean_data(data, imputer, mapper=None):
+    """run every cleaning step on a dataframe (or a chunk) of the raw data"""
+    data = (mapper or column_mapper).rename(data)
+    data = imputer.transform(data)
+    data = convert_gestational_ages(data)
+    data = exclude_diabetes_mellitus(data)
+    return data
+
+
+def read_raw(path, chunksize=None, **kwargs):
+    """read the raw csv, in chunks if chunksize is given"""
+    return pd.read_csv(path, chunksize=chunksize, **kwargs)
+
+
+def fit_imputer(input_path, chunksize=None, mapper=None):
+    """first pass over the raw csv, accumulating the imputation statistics"""
+    #only the imputed columns are needed to fit the imputation values
+    raw_columns = read_raw(input_path, nrows=0).columns
+    clean_names = (mapper or column_mapper).mapping(raw_columns)
+    usecols = [raw for raw, clean in clean_names.items() if clean in impute_mode + impute_mean]
+
+    chunks = read_raw(input_path, chunksize=chunksize, usecols=usecols)
+    if chunksize is None:
+        chunks = [chunks]
+    return new_imputer().fit(chunk.rename(columns=clean_names) for chunk in chunks)
+
+
+def clean_file(input_path, output_paths, chunksize=None, imputer=None, mapper=None):
+    """clean the raw csv and save it to every output path (parquet, feather or csv)
+
+    The imputation statistics are fitted in a first pass over the file unless a fitted imputer is given,
+    then every chunk is cleaned and saved in a second pass. Returns the number of rows saved and the imputer.
+    """
+    if imputer is None:
+        imputer = fit_imputer(input_path, chunksize=chunksize, mapper=mapper)
+
+    chunks = read_raw(input_path, chunksize=chunksize)
+    if chunksize is None:
+        chunks = [chunks]
+
+    writers = [CleanedWriter(path) for path in output_paths]
+    n_rows = 0
+    try:
+        for chunk in chunks:
+            cleaned = clean_data(chunk, imputer, mapper=mapper)
+            for writer in writers:
+                writer.write(cleaned)
+            n_rows += len(cleaned)
+    finally:
+        for writer in writers:
+            writer.close()
+    return n_rows, imputer
+
+
+def report_outliers(cleaned_path, report_path, method="iqr"):
+    """save the outliers of the cleaned data, computed within each GDM group, returns the number of flagged values
+
+    The group statistics need every row, so this reads the saved output instead of working chunk by chunk.
+    """
+    report = outlier_report(read_cleaned(cleaned_path), group="gestational_dm", method=method)
+    report.to_csv(report_path, index=False)
+    return len(report)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clean the visceral fat study dataset.")
+    parser.add_argument("--input", default="datasets/visceral_fat_study.csv", help="raw csv file")
+    parser.add_argument("--output", nargs="+", default=["datasets/gdm_vat_data_cleaned.parquet"],
+                        help="cleaned output file(s), .parquet, .feather or .csv")
+    parser.add_argument("--chunksize", type=int, default=None, help="number of rows to clean at a time")
+    parser.add_argument("--imputation-stats", default=None,
+                        help="json file with imputation statistics from a previous run, used instead of fitting new ones")
+    parser.add_argument("--save-imputation-stats", default=None, help="save the imputation statistics to this json file")
+    parser.add_argument("--column-mappings", default=None,
+                        help="json file of raw -> clean column names, reused for files with the same columns")
+    parser.add_argument("--outlier-report", default=None, help="save the outliers of the cleaned data to this csv file")
+    parser.add_argument("--outlier-method", default="iqr", choices=outlier_methods,
+                        help="outlier scores used for --outlier-report")
+    args = parser.parse_args(argv)
+
+    imputer = StreamingImputer.load(args.imputation_stats) if args.imputation_stats else None
+    mapper = ColumnMapper(args.column_mappings)
+    n_rows, imputer = clean_file(args.input, args.output, chunksize=args.chunksize, imputer=imputer, mapper=mapper)
+    if args.save_imputation_stats:
+        imputer.save(args.save_imputation_stats)
+    print(f"Saved {n_rows} cleaned rows to {', '.join(args.output)}")
+    if args.outlier_report:
+        n_outliers = report_outliers(args.output[0], args.outlier_report, args.outlier_method)
+        print(f"Saved {n_outliers} outliers to {args.outlier_report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,20 +8,22 @@ Created on Wed Jan  3 21:09:22 2024
 import pandas as pd 
 import numpy as np 
 import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy.stats import norm, f, ttest_ind, chi2_contingency
+from exploratory_data_analysis.vat_gdm_figures import (bp_var, cat_var, plot_bmi_scatterplots, plot_boxplots,
+    plot_categorical_barplots, plot_categorical_violinplots, plot_correlation_heatmap, plot_gdm_counts, plot_histograms)
+from exploratory_data_analysis.vat_gdm_statistics import compare_groups
+from exploratory_data_analysis.vat_gdm_permutation import permutation_test
+from exploratory_data_analysis.vat_gdm_outliers import outlier_flags, outlier_report, outlier_scores
+from exploratory_data_analysis.vat_gdm_schema import as_codes, read_cleaned
 
-#Load dataset
-data_copy = pd.read_csv("gdm_vat_data_cleaned.csv")
+#Load dataset, with ethnicity, type of delivery and GDM status as their 0/1 codes
+data_copy = as_codes(read_cleaned("datasets/gdm_vat_data_cleaned.parquet"))
 
 
 #VISUALIZATIONS
 
 #USING FACETGRID TO COMPARE NUMBER OF PARTICIPANTS BY DISEASE STATUS
 #Plot comparing total number of participants with GDM and without GDM
-g = sns.FacetGrid(data_copy, col="gestational_dm")
-g.map_dataframe(sns.histplot, x="gestational_dm")
-g.set_axis_labels("GDM Status", "Count")
+plot_gdm_counts(data_copy)
 plt.show()
 
 #GDM/non-GDM ratio in cohort:
@@ -44,28 +46,12 @@ len(gdm)/len(non_gdm)
 #Barplots to look at averages of categorical variables between GDM and non-GDM
 #The demographic variables are categorical variables.
 
-#Categorical variables
-cat_var = ["ethnicity", "pregnancies", "type_of_delivery"]
+#Categorical variables (cat_var in vat_gdm_figures)
+#"ethnicity", "pregnancies", "type_of_delivery"
 
 #BARPLOTS
-ncols = 2
-nrows = int(np.ceil(len(cat_var)/ncols))
-fig,axes = plt.subplots(nrows=nrows, ncols=ncols)
-
-for i, var in enumerate(cat_var):
-    row = int(np.floor(i/ncols))
-    col = i%ncols
-    
-    #barplot
-    sns.set_style("dark")
-    a = sns.barplot(data_copy, x=data_copy["gestational_dm"], y=data_copy[var], ax= axes[row,col], color="lightblue")
-    
-    #axis properties
-    a.tick_params(labelsize=8)
-
-plt.suptitle("Barplots of Categorical Variables (non-GDM = 0, GDM = 1)", fontsize=12)
-plt.tight_layout()
-plt.show() 
+plot_categorical_barplots(data_copy)
+plt.show()
 
 
 #Note about measurements:
@@ -84,23 +70,7 @@ plt.show()
 
 #Violin plots can show the distribution and proportion of values for categorical variables.
 
-ncols = 2
-nrows = int(np.ceil(len(cat_var)/ncols))
-fig,axes = plt.subplots(nrows=nrows, ncols=ncols)
-
-for i,var in enumerate(cat_var):
-    row = int(np.floor(i/ncols))
-    col = i%ncols
-    
-    sns.set_style("dark")
-    sns.violinplot(ax=axes[row,col], data=data_copy, x=data_copy["gestational_dm"], y=data_copy[var], 
-                   palette = "deep", hue= data_copy["gestational_dm"])
-    axes[row,col].legend([], [], frameon=False)
- 
-
-#add main title
-plt.suptitle("Violinplots for Categorical Variables", fontsize=12)
-plt.tight_layout()
+plot_categorical_violinplots(data_copy)
 plt.show()
 
 #Summary:
@@ -113,51 +83,16 @@ plt.show()
 #BOXPLOTS FOR CONTINUOUS VARIABLES
 #Boxplots to see distribution of data and to identify potential outliers
 
-#Boxplot variables (continuous variables)
-bp_var = ["mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat",
-"first_fasting_glucose","bmi_pregestational", "child_birth_weight", "gestational_age_at_birth", "current_gestational_age", "age"]
+#Boxplot variables (continuous variables, bp_var in vat_gdm_figures)
+#"mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat", "first_fasting_glucose", "bmi_pregestational",
+#"child_birth_weight", "gestational_age_at_birth", "current_gestational_age", "age"
 
 #NON-GDM
-ncol = 3
-nrow = int(np.ceil(len(bp_var)/ncol))
-fig,axes = plt.subplots(nrow, ncol)
-for i, var in enumerate(bp_var):
-    row = int(np.floor(i/ncol))
-    col = i%ncol
-    
-    #boxplots
-    axes[row,col].boxplot(non_gdm[var], patch_artist=True,
-            boxprops=dict(facecolor="royalblue", color="black", linewidth=1),
-            whiskerprops=dict(color="black", linewidth=1), 
-            medianprops=dict(color="black", linewidth=1), 
-            capprops=dict(color="black", linewidth=1),
-            flierprops=dict(markerfacecolor="royalblue", marker="o", markersize=5))
-    #axes properties
-    axes[row,col].set_title(var, fontsize=10)
-    
-plt.suptitle("Boxplots for Non-GDM Individuals")
-plt.tight_layout()
+plot_boxplots(data_copy, status=0)
 plt.show()
 
 #GDM
-ncol = 3
-nrow = int(np.ceil(len(bp_var)/ncol))
-fig,axes = plt.subplots(nrow, ncol)
-for i, var in enumerate(bp_var):
-    row = int(np.floor(i/ncol))
-    col = i%ncol
-    
-    #boxplots
-    axes[row,col].boxplot(gdm[var], patch_artist=True,
-            boxprops=dict(facecolor="pink", color="black", linewidth=1),
-            whiskerprops=dict(color="black", linewidth=1), 
-            medianprops=dict(color="black", linewidth=1), 
-            capprops=dict(color="black", linewidth=1),
-            flierprops=dict(markerfacecolor="pink", marker="o", markersize=5))
-    axes[row,col].set_title(var, fontsize=10)
-
-plt.suptitle("Boxplots for GDM Individuals")
-plt.tight_layout()
+plot_boxplots(data_copy, status=1)
 plt.show()
 
 
@@ -169,29 +104,26 @@ plt.show()
 #Z-SCORE
 #Checking z-score for every continuous variable for GDM and non-GDM groups
 #I will check the z-score for every variable and see if any have a standard deviation above 3.
-def check_z_score(data,var_list):
-    scores = {}
-    for var in var_list:
-        #rename variable data to data
-        new_data = data[var]
-        #find mean and standard deviation for the variable
-        mu = new_data.mean()
-        sd = new_data.std()
-        for x in new_data:
-            z_score = round((x - mu)/sd,2)
-        if abs(z_score) >= 2:
-            scores[var] = z_score
-    return scores
-
-#Non-GDM z-score
-non_gdm_z_scores = check_z_score(non_gdm, bp_var)
-
-#GDM z-score
-gdm_z_score = check_z_score(gdm, bp_var)
+#outlier_scores computes z-scores, robust (MAD) z-scores and IQR fence distances for every row at once,
+#within each GDM group, and outlier_flags marks the values above the thresholds (|z| > 3, |MAD score| > 3.5, 1.5 IQR)
+z_scores = outlier_scores(data_copy, bp_var, group="gestational_dm")["z_score"]
+
+#Largest absolute z-score per variable
+non_gdm_z_scores = pd.Series(np.nanmax(np.abs(z_scores[data_copy["gestational_dm"] == 0]), axis=0), index=bp_var).round(2)
+gdm_z_score = pd.Series(np.nanmax(np.abs(z_scores[data_copy["gestational_dm"] == 1]), axis=0), index=bp_var).round(2)
+print(pd.DataFrame({"non_gdm": non_gdm_z_scores, "gdm": gdm_z_score}))
+
+#Flagged values with each method
+for method in ["z_score", "mad", "iqr"]:
+    print(method, outlier_flags(data_copy, bp_var, group="gestational_dm", method=method).sum().to_dict())
+print(outlier_report(data_copy, bp_var, group="gestational_dm", method="z_score"))
 
 #Summary:
-#A few z-scores are above 2 and are close to 3, but none of them are as high as 3.
-#This means that all values are within 3 standard deviations of the mean.
+#In the GDM group all values are within 3 standard deviations of the mean (largest z-score 2.95).
+#The non-GDM group has 10 values above 3 standard deviations, up to 6.02 for gestational_age_at_birth,
+#in 8 participants (e.g. participant 73 has a low child_birth_weight and gestational_age_at_birth, a preterm birth).
+#This matches the boxplots showing more outliers in the non-GDM group.
+#The values are plausible measurements, so they are kept, but the non-parametric tests are reported alongside the t-tests.
 
 
 
@@ -200,65 +132,11 @@ gdm_z_score = check_z_score(gdm, bp_var)
 
 
 #NON-GDM INDIVIDUALS
-ncols = 3
-nrows = int(np.ceil(len(bp_var)/ncol))
-fig,axes = plt.subplots(nrows=nrows, ncols=ncols,figsize=(10,7))
-    
-for i,var in enumerate(bp_var):
-    row = int(np.floor(i/ncols))
-    col = i%ncols
-    
-    #Histogram
-    sns.set_style(style="dark")
-    a=sns.histplot(data=non_gdm, x=non_gdm[var], ax=axes[row,col], bins=15, stat="density", color="lightblue")
-    
-    #PDF
-    #fit normal distribution specifically to each variable
-    mean, sd = norm.fit(non_gdm[var])
-    #fit the min and max x values specifically to each variable
-    x = np.linspace(non_gdm[var].min(), non_gdm[var].max(), 100)
-    p = norm.pdf(x, mean, sd)
-    #overlay the plot on top of the histogram
-    a.plot(x, p, "k", linewidth = 1, color = "black", alpha=0.6)
-    
-    #axis labels
-    a.set_xlabel(var, fontsize=10)
-    a.set_ylabel("Density", fontsize=10)
-    a.tick_params(labelsize=8)
-
-plt.suptitle("Histograms and Density Curve for Non-GDM Individuals", fontsize=12)
-plt.tight_layout()
+plot_histograms(data_copy, status=0, bins=15)
 plt.show()
 
 #GDM INDIVIDUALS
-ncols = 3
-nrows = int(np.ceil(len(bp_var)/ncol))
-fig,axes = plt.subplots(nrows=nrows, ncols=ncols, figsize=(10,7))
-    
-for i,var in enumerate(bp_var):
-    row = int(np.floor(i/ncols))
-    col = i%ncols
-    
-    #Histogram
-    sns.set_style(style="dark")
-    a=sns.histplot(data=non_gdm, x=non_gdm[var], ax=axes[row,col], bins=8, stat="density", color="lightpink")
-    
-    #PDF
-    #fit normal distribution specifically to each variable
-    mean, sd = norm.fit(gdm[var])
-    #fit the min and max x values specifically to each variable
-    x = np.linspace(gdm[var].min(), gdm[var].max(), 100)
-    p = norm.pdf(x, mean, sd)
-    #overlay the plot on top of the histogram
-    a.plot(x, p, "k", linewidth = 1, color = "black", alpha=0.6)
-    
-    #axis labels
-    a.set_xlabel(var, fontsize=10)
-    a.set_ylabel("Density", fontsize=10)
-    a.tick_params(labelsize=8)
-
-plt.suptitle("Histograms and Density Curve for GDM Individuals", fontsize=12)
-plt.tight_layout()
+plot_histograms(data_copy, status=1, bins=8)
 plt.show()
 
 #Summary
@@ -270,22 +148,7 @@ plt.show()
 #BMI is highly linked with GDM. 
 #I want to look at the impact of both BMI and GDM on other variables. 
 
-ncols = 3
-nrows = int(np.ceil(len(bp_var)/ncol))
-fig,axes = plt.subplots(nrows=nrows, ncols=ncols, figsize=(10,7))
-    
-for i,var in enumerate(bp_var):
-    row = int(np.floor(i/ncols))
-    col = i%ncols
-    
-    sns.set_style("dark")
-    sns.scatterplot(ax= axes[row,col], data = data_copy, x= "bmi_pregestational", y=var, 
-                    hue="gestational_dm", palette="pastel")
-    axes[row,col].legend([], [], frameon=False)
-  
-plt.legend()
-plt.suptitle("Scatterplot Comparing Pregestational BMI vs. Continuous Variables", fontsize=12)
-plt.tight_layout()
+plot_bmi_scatterplots(data_copy)
 plt.show()
 
 #Summary:
@@ -308,61 +171,47 @@ gdm_stats = gdm.describe()
 #F-test to compare variances of variables between GDM and non-gdm groups
 #Formula: F value = variance_1/variance_2
 
-def f_test(x_gdm, x_non_gdm):
-    #converting variables to numpy arrays
-    x_gdm = np.array(x_gdm)
-    x_non_gdm = np.array(x_non_gdm)
-    
-    #calculating F test statistic
-    f_stat = np.var(x_gdm, ddof=1)/np.var(x_non_gdm, ddof=1) 
-    
-    #Finding P value of F test stat
-    dfn = x_gdm.size-1 #degrees of freedom numerator 
-    dfd = x_non_gdm.size-1 #degrees of freedom denominator 
-    p = 1-f.cdf(f_stat, dfn, dfd) #finds p-value
-    return f, p
-
-
-for var in bp_var:
-    result = f_test(gdm[var], non_gdm[var])
-    print(f"{var}:{result}\n")
-
-#The variance of first fasting glucose is significantly different between GDM and non-GDM groups (p = 0.01).
-#Will need to adjust t-test for first fasting glucose statistic.
-#The variances of all other continous variables are similar since p is greater than 0.05.
-
-
-
 #T-TEST
 #I will perform t-tests to compare the means of continuous variables between GDM and non-GDM groups. 
 #This was done in the study as well.
 
 #T test assumes variables have a normal distribution and similar variances.
-#Fasting glucose variances were shown to be different between groups, will adjust t test to account for this.
+#When the F-test shows different variances, Welch's t-test (which doesn't assume equal variances) is used instead.
+#The Mann-Whitney U test is included since some variables don't look normally distributed.
 
 #Parameters:
 # Level of significance: p < 0.05 with 95% confidence interval
 
-#Two sample t-test for all continuous variables 
-for var in bp_var:
-    #converting all lists of variables to a np array
-    gdm_var = np.array(gdm[var])
-    non_gdm_var = np.array(non_gdm[var])
-    
-    #t-test for variables except glucose
-    if var != "first_fasting_glucose":        
-        #t test
-        t_statistic, p_value = ttest_ind(gdm_var, non_gdm_var)
-        print(f"{var}: t-statistic of {t_statistic}, p-value of {p_value}\n")
-    else:
-        #adjust equal_var to be False to perform Welch's t-test which doesn't assume equal variances
-        t_statistic, p_value = ttest_ind(gdm_var, non_gdm_var, equal_var=False)
-        print(f"{var}: t-statistic of {t_statistic}, p-value of {p_value}\n")
-        
+#TESTS FOR CATEGORICAL VARIABLES
+#The chi-square test is used to look at the distribution of data between groups
+#Fisher's exact test is used when expected counts are too small for the chi-square test
+#Pregnancies are split into two groups: less than/equal 3 and greater than 3
+
+#All tests are run for every variable at once (see vat_gdm_statistics), p-values are adjusted for multiple testing
+group_tests = compare_groups(data_copy, group="gestational_dm", positive=1,
+                             continuous=bp_var, categorical=cat_var)
+print(group_tests[["variable", "test", "statistic", "p_value", "p_adjusted", "significant"]])
+
+#The variances of first fasting glucose (p = 0.02) and child birth weight (p = 0.04) are significantly different
+#between GDM and non-GDM groups, so Welch's t-test is used for these two variables.
 
 #Summary:
-#The mean diastolic blood pressure (p = 0.03), central fat (p = 0.0004), first fasting glucose (p = 0.003), age (p =0.03), and BMI (p = 0.003) were significantly different between groups.
+#The mean diastolic blood pressure (p = 0.03), central fat (p = 0.0004), first fasting glucose (p = 0.004), age (p =0.03), and BMI (p = 0.003) were significantly different between groups.
 #Other continuous variables are not significantly different between groups.
+#After adjusting for multiple testing, mean diastolic blood pressure is no longer significant (adjusted p = 0.05).
+
+
+#PERMUTATION TESTS
+#Permutation tests don't assume normal distributions (gestational age at birth isn't normally distributed),
+#the GDM labels are shuffled 9999 times and the mean and median differences are recomputed for every variable.
+permutation_results = permutation_test(data_copy, group="gestational_dm", positive=1, variables=bp_var,
+                                       n_permutations=9999, seed=123)
+print(permutation_results[["variable", "statistic", "observed", "p_value", "p_adjusted", "significant"]])
+
+#Summary:
+#The mean differences agree with the t-tests: central fat (p = 0.0005), first fasting glucose (p = 0.0001), BMI (p = 0.004),
+#mean diastolic blood pressure (p = 0.04) and age (p = 0.03) differ between groups, only the first three remain significant after adjustment.
+#The median differences are significant for central fat and first fasting glucose after adjustment (adjusted p = 0.03 for both).
 
 
 #comparing non-gdm and gdm stats
@@ -372,47 +221,8 @@ gdm_stats
 #The GDM group has signficantly higher mean diastolic bp, central fat, first fasting glucose, and BMI.
 
 
-#TESTS FOR CATEGORICAL VARIABLES
-
-#The chi-square test is used to look at the distribution of data between groups
-
-for var in cat_var:
-    #fishers test to compare ethnicity and type of delivery 
-    if var == "ethnicity" or var == "type_of_delivery":
-        gdm_var_0 = gdm.loc[gdm[var]== 0][var]
-        gdm_var_1 = gdm.loc[gdm[var]== 1][var]
-        
-        non_gdm_var_0 = non_gdm.loc[non_gdm[var]== 0][var]
-        non_gdm_var_1 = non_gdm.loc[non_gdm[var]== 1][var]
-        
-        #contingency table
-        table = np.array([[non_gdm_var_0.count(),gdm_var_0.count()], [non_gdm_var_1.count(), gdm_var_1.count()]])
-        
-        #chi square test
-        stat, pvalue, dof, expected_freq = chi2_contingency(table)
-        
-        print(f"{var}: chi-square stat {stat}, p-value {pvalue}\n")
-    else:
-        #split pregnancies into two groups: less than/equal 3 and greater than 3 
-        gdm_var_0 = gdm.loc[gdm[var] <= 3][var]
-        gdm_var_1 = gdm.loc[gdm[var] > 3][var]
-        
-        non_gdm_var_0 = non_gdm.loc[non_gdm[var] <= 3][var]
-        non_gdm_var_1 = non_gdm.loc[non_gdm[var] > 3][var]
-        
-        table = np.array([[non_gdm_var_0.count(),gdm_var_0.count()], [non_gdm_var_1.count(), gdm_var_1.count()]])
-        
-        stat, pvalue, dof, expected_freq = chi2_contingency(table)
-
-        print(f"{var}: chi-square stat {stat}, p-value {pvalue}\n")
-
-
-        
-        print(f"{var}: chi-square stat {stat}, p-value {pvalue}\n")
-        
-
 #Results:
-#Type of delivery is significantly different between gdm and non-gdm groups (p=0.04).
+#Type of delivery is significantly different between gdm and non-gdm groups (p=0.03, Fisher's exact test), but not after adjusting for multiple testing.
 #Other categorical variables (age, ethnicity, pregnancies) are not significantly different between groups.
     
     
@@ -421,21 +231,12 @@ for var in cat_var:
 
 #Pearson Correlation coefficient
 
-#creating dataframe with continuous variables and discrete numerical variables
-data_corr_coef = data_copy.drop(["number", "gestational_dm", "ethnicity", "type_of_delivery"], axis=1)
-
+#using the continuous variables and discrete numerical variables
 #Cannot use ethnicity or type of delivery in Pearson's correlation test since the numbers 
 # are assigned to represent labels, and don't represent quantities.
 
-#correlation matrix
-corr_matrix = data_corr_coef.corr(method = "pearson")
-
 #correlation heatmap
-plt.figure(figsize=(8,6))
-a = sns.heatmap(data=corr_matrix, cmap=sns.cubehelix_palette(as_cmap=True), annot=True)
-a.set_title("Correlation Heatmap", fontsize = 12)
-
-plt.tight_layout()
+plot_correlation_heatmap(data_copy)
 plt.show()
 
 #Summary:
@@ -0,0 +1,101 @@
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.compose import ColumnTransformer, make_column_selector
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+
+#PREPROCESSING + MODEL
+#Data transformations should be learned from a training set, so the scaler is part of the pipeline
+#and is fit inside each cross validation fold (fitting it on the whole dataset leaks the test fold statistics).
+#One scaler standardizes every numeric column at once, nominal variables (categoricals in the cleaned schema) are passed through.
+
+def gdm_pipeline(**log_reg_params):
+    """scaler + logistic regression pipeline, shared by all models"""
+    scaler = ColumnTransformer(
+        [("scale", StandardScaler(), make_column_selector(dtype_include="number"))],
+        remainder="passthrough",
+        verbose_feature_names_out=False,
+    )
+    return Pipeline([
+        ("scaler", scaler),
+        ("log_reg", LogisticRegression(**{"random_state": 123, **log_reg_params})),
+    ])
+
+
+#MODEL EVALUATION
+#cross_validate and cross_val_predict fit every fold twice (once for the scores, once for the predictions).
+#evaluate_models fits each fold once, collecting scores and out-of-fold predictions together,
+#and runs every model x fold in parallel with joblib (n_jobs=-1 uses all cores).
+
+def fit_fold(estimator, x, y, train_idx, test_idx, scoring):
+    """fit one fold, returning train/test scores and predictions for the test rows"""
+    estimator = clone(estimator)
+    x_train, x_test = x.iloc[train_idx], x.iloc[test_idx]
+    y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
+
+    start = time.perf_counter()
+    estimator.fit(x_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = {}
+    for name in scoring:
+        scorer = get_scorer(name)
+        scores[f"test_{name}"] = scorer(estimator, x_test, y_test)
+        scores[f"train_{name}"] = scorer(estimator, x_train, y_train)
+    score_time = time.perf_counter() - start
+
+    return {
+        "scores": scores,
+        "fit_time": fit_time,
+        "score_time": score_time,
+        "test_idx": test_idx,
+        "y_pred": estimator.predict(x_test),
+        "y_proba": estimator.predict_proba(x_test)[:, 1],
+    }
+
+
+def evaluate_models(models, estimator, cv=7, scoring=("roc_auc", "average_precision"), n_jobs=None):
+    """cross validate several models at once
+
+    models: dict of model name -> (x, y)
+    cv: number of stratified folds (same splits as cross_validate with an integer cv) or a splitter
+
+    Returns a dict of model name -> {"scores": cross_validate style dict of arrays,
+    "y_pred": out-of-fold predictions, "y_proba": out-of-fold probabilities of GDM}
+    """
+    splitter = StratifiedKFold(n_splits=cv) if isinstance(cv, int) else cv
+    tasks = []
+    for name, (x, y) in models.items():
+        for train_idx, test_idx in splitter.split(x, y):
+            tasks.append((name, x, y, train_idx, test_idx))
+
+    folds = Parallel(n_jobs=n_jobs)(
+        delayed(fit_fold)(estimator, x, y, train_idx, test_idx, scoring)
+        for name, x, y, train_idx, test_idx in tasks
+    )
+
+    results = {}
+    for (name, x, y, _, _), fold in zip(tasks, folds):
+        if name not in results:
+            results[name] = {"scores": {"fit_time": [], "score_time": []},
+                             "y_pred": np.empty(len(y), dtype=fold["y_pred"].dtype),
+                             "y_proba": np.empty(len(y))}
+        result = results[name]
+        result["scores"]["fit_time"].append(fold["fit_time"])
+        result["scores"]["score_time"].append(fold["score_time"])
+        for key, value in fold["scores"].items():
+            result["scores"].setdefault(key, []).append(value)
+        result["y_pred"][fold["test_idx"]] = fold["y_pred"]
+        result["y_proba"][fold["test_idx"]] = fold["y_proba"]
+
+    for result in results.values():
+        result["scores"] = {key: np.array(values) for key, values in result["scores"].items()}
+    return results
@@ -0,0 +1,173 @@
+import numpy as np
+import matplotlib.pyplot as plt
+import seaborn as sns
+from scipy.stats import norm
+
+
+#EDA FIGURES
+#Every figure of the EDA is built by one function that takes the cleaned data (0/1 codes, see vat_gdm_schema.as_codes)
+#and returns the matplotlib figure, so the same figures can be shown interactively in vat_gdm_eda
+#or rendered headless and saved by vat_gdm_report.
+
+#Categorical variables
+cat_var = ["ethnicity", "pregnancies", "type_of_delivery"]
+
+#Continuous variables
+bp_var = ["mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat",
+"first_fasting_glucose","bmi_pregestational", "child_birth_weight", "gestational_age_at_birth", "current_gestational_age", "age"]
+
+#colours of the boxplots and histograms for each GDM status
+group_colors = {
+    "boxplot": {0: "royalblue", 1: "pink"},
+    "histogram": {0: "lightblue", 1: "lightpink"},
+}
+group_names = {0: "Non-GDM", 1: "GDM"}
+
+
+def _grid(n, ncols, **kwargs):
+    """figure with enough rows of ncols axes for n plots"""
+    nrows = int(np.ceil(n/ncols))
+    with sns.axes_style("dark"):
+        fig, axes = plt.subplots(nrows=nrows, ncols=ncols, **kwargs)
+    return fig, axes
+
+
+def plot_gdm_counts(data):
+    """number of participants with and without GDM"""
+    g = sns.FacetGrid(data, col="gestational_dm")
+    g.map_dataframe(sns.histplot, x="gestational_dm")
+    g.set_axis_labels("GDM Status", "Count")
+    return g.figure
+
+
+def plot_categorical_barplots(data):
+    """average of the categorical variables by GDM status"""
+    ncols = 2
+    fig, axes = _grid(len(cat_var), ncols)
+    for i, var in enumerate(cat_var):
+        row = int(np.floor(i/ncols))
+        col = i%ncols
+        a = sns.barplot(data, x=data["gestational_dm"], y=data[var], ax= axes[row,col], color="lightblue")
+        #axis properties
+        a.tick_params(labelsize=8)
+    fig.suptitle("Barplots of Categorical Variables (non-GDM = 0, GDM = 1)", fontsize=12)
+    fig.tight_layout()
+    return fig
+
+
+def plot_categorical_violinplots(data):
+    """distribution of the categorical variables by GDM status"""
+    ncols = 2
+    fig, axes = _grid(len(cat_var), ncols)
+    for i,var in enumerate(cat_var):
+        row = int(np.floor(i/ncols))
+        col = i%ncols
+        sns.violinplot(ax=axes[row,col], data=data, x=data["gestational_dm"], y=data[var],
+                       palette = "deep", hue= data["gestational_dm"])
+        axes[row,col].legend([], [], frameon=False)
+    fig.suptitle("Violinplots for Categorical Variables", fontsize=12)
+    fig.tight_layout()
+    return fig
+
+
+def plot_boxplots(data, status):
+    """boxplots of the continuous variables for one GDM status (0 or 1)"""
+    subset = data.loc[data["gestational_dm"] == status]
+    color = group_colors["boxplot"][status]
+    ncol = 3
+    fig, axes = _grid(len(bp_var), ncol)
+    for i, var in enumerate(bp_var):
+        row = int(np.floor(i/ncol))
+        col = i%ncol
+        axes[row,col].boxplot(subset[var], patch_artist=True,
+                boxprops=dict(facecolor=color, color="black", linewidth=1),
+                whiskerprops=dict(color="black", linewidth=1),
+                medianprops=dict(color="black", linewidth=1),
+                capprops=dict(color="black", linewidth=1),
+                flierprops=dict(markerfacecolor=color, marker="o", markersize=5))
+        #axes properties
+        axes[row,col].set_title(var, fontsize=10)
+    fig.suptitle(f"Boxplots for {group_names[status]} Individuals")
+    fig.tight_layout()
+    return fig
+
+
+def plot_histograms(data, status, bins):
+    """histograms with a fitted normal density curve for one GDM status (0 or 1)"""
+    subset = data.loc[data["gestational_dm"] == status]
+    ncols = 3
+    fig, axes = _grid(len(bp_var), ncols, figsize=(10,7))
+    for i,var in enumerate(bp_var):
+        row = int(np.floor(i/ncols))
+        col = i%ncols
+
+        #Histogram
+        a=sns.histplot(data=subset, x=subset[var], ax=axes[row,col], bins=bins, stat="density",
+                       color=group_colors["histogram"][status])
+
+        #PDF
+        #fit normal distribution specifically to each variable
+        mean, sd = norm.fit(subset[var])
+        #fit the min and max x values specifically to each variable
+        x = np.linspace(subset[var].min(), subset[var].max(), 100)
+        p = norm.pdf(x, mean, sd)
+        #overlay the plot on top of the histogram
+        a.plot(x, p, linewidth = 1, color = "black", alpha=0.6)
+
+        #axis labels
+        a.set_xlabel(var, fontsize=10)
+        a.set_ylabel("Density", fontsize=10)
+        a.tick_params(labelsize=8)
+    fig.suptitle(f"Histograms and Density Curve for {group_names[status]} Individuals", fontsize=12)
+    fig.tight_layout()
+    return fig
+
+
+def plot_bmi_scatterplots(data):
+    """pregestational BMI against every continuous variable, coloured by GDM status"""
+    ncols = 3
+    fig, axes = _grid(len(bp_var), ncols, figsize=(10,7))
+    for i,var in enumerate(bp_var):
+        row = int(np.floor(i/ncols))
+        col = i%ncols
+        sns.scatterplot(ax= axes[row,col], data = data, x= "bmi_pregestational", y=var,
+                        hue="gestational_dm", palette="pastel")
+        axes[row,col].legend([], [], frameon=False)
+    axes[-1,-1].legend()
+    fig.suptitle("Scatterplot Comparing Pregestational BMI vs. Continuous Variables", fontsize=12)
+    fig.tight_layout()
+    return fig
+
+
+def plot_correlation_heatmap(data):
+    """pearson correlation of the continuous and discrete numerical variables"""
+    #Cannot use ethnicity or type of delivery in Pearson's correlation test since the numbers
+    # are assigned to represent labels, and don't represent quantities.
+    data_corr_coef = data.drop(["number", "gestational_dm", "ethnicity", "type_of_delivery"], axis=1, errors="ignore")
+    corr_matrix = data_corr_coef.corr(method = "pearson")
+    fig = plt.figure(figsize=(8,6))
+    a = sns.heatmap(data=corr_matrix, cmap=sns.cubehelix_palette(as_cmap=True), annot=True)
+    a.set_title("Correlation Heatmap", fontsize = 12)
+    fig.tight_layout()
+    return fig
+
+
+#name -> (title, function, keyword arguments, columns the figure depends on)
+#the columns are hashed by vat_gdm_report to skip figures whose data hasn't changed
+eda_figures = {
+    "gdm_counts": ("Number of Participants by GDM Status", plot_gdm_counts, {}, ["gestational_dm"]),
+    "categorical_barplots": ("Barplots of Categorical Variables", plot_categorical_barplots, {},
+                             ["gestational_dm"] + cat_var),
+    "categorical_violinplots": ("Violinplots for Categorical Variables", plot_categorical_violinplots, {},
+                                ["gestational_dm"] + cat_var),
+    "boxplots_non_gdm": ("Boxplots for Non-GDM Individuals", plot_boxplots, {"status": 0}, ["gestational_dm"] + bp_var),
+    "boxplots_gdm": ("Boxplots for GDM Individuals", plot_boxplots, {"status": 1}, ["gestational_dm"] + bp_var),
+    "histograms_non_gdm": ("Histograms for Non-GDM Individuals", plot_histograms, {"status": 0, "bins": 15},
+                           ["gestational_dm"] + bp_var),
+    "histograms_gdm": ("Histograms for GDM Individuals", plot_histograms, {"status": 1, "bins": 8},
+                       ["gestational_dm"] + bp_var),
+    "bmi_scatterplots": ("Pregestational BMI vs. Continuous Variables", plot_bmi_scatterplots, {},
+                         ["gestational_dm"] + bp_var),
+    "correlation_heatmap": ("Correlation Heatmap", plot_correlation_heatmap, {},
+                            bp_var + ["pregnancies"]),
+}
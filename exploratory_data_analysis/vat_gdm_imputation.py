@@ -0,0 +1,86 @@
+import json
+from collections import Counter
+
+import numpy as np
+
+
+#STREAMING IMPUTATION
+#The cleaning step fills missing values with the mean (continuous) or mode (discrete) of each column.
+#When the raw file is read in chunks the whole column is never in memory, so the statistics are
+#accumulated chunk by chunk in a first pass (running sum/count for means, value counts for modes)
+#and the missing values are filled in a second pass.
+#The fitted statistics can be saved and loaded so new batches are filled with the same values.
+
+class StreamingImputer:
+    """mean/mode imputation fitted one chunk at a time"""
+
+    def __init__(self, mean_columns, mode_columns):
+        self.mean_columns = list(mean_columns)
+        self.mode_columns = list(mode_columns)
+        self.sums = {col: 0.0 for col in self.mean_columns}
+        self.counts = {col: 0 for col in self.mean_columns}
+        self.value_counts = {col: Counter() for col in self.mode_columns}
+
+    def partial_fit(self, chunk):
+        """add the non-missing values of a chunk to the statistics"""
+        for col in self.mean_columns:
+            values = chunk[col].to_numpy(dtype="float64")
+            values = values[~np.isnan(values)]
+            self.sums[col] += float(values.sum())
+            self.counts[col] += int(values.size)
+        for col in self.mode_columns:
+            counts = chunk[col].value_counts(dropna=True)
+            self.value_counts[col].update(dict(zip(counts.index.tolist(), counts.tolist())))
+        return self
+
+    def fit(self, chunks):
+        """fit the statistics over an iterable of chunks"""
+        for chunk in chunks:
+            self.partial_fit(chunk)
+        return self
+
+    @property
+    def fill_values(self):
+        """value used to fill each column"""
+        values = {}
+        for col in self.mode_columns:
+            if not self.value_counts[col]:
+                raise ValueError(f"no values seen for {col}, cannot find the mode")
+            #ties go to the smallest value, like pandas mode().iloc[0]
+            top = max(self.value_counts[col].values())
+            values[col] = min(v for v, n in self.value_counts[col].items() if n == top)
+        for col in self.mean_columns:
+            if self.counts[col] == 0:
+                raise ValueError(f"no values seen for {col}, cannot find the mean")
+            values[col] = self.sums[col] / self.counts[col]
+        return values
+
+    def transform(self, chunk):
+        """fill missing values in a chunk"""
+        return chunk.fillna(self.fill_values)
+
+    def save(self, path):
+        """save the fitted statistics as json"""
+        stats = {
+            "mean_columns": self.mean_columns,
+            "mode_columns": self.mode_columns,
+            "sums": self.sums,
+            "counts": self.counts,
+            #json keys have to be strings, so value counts are saved as [value, count] pairs
+            "value_counts": {col: [[v, n] for v, n in counts.items()] for col, counts in self.value_counts.items()},
+            "fill_values": self.fill_values,
+        }
+        with open(path, "w") as f:
+            json.dump(stats, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """load statistics saved with save()"""
+        with open(path) as f:
+            stats = json.load(f)
+        imputer = cls(stats["mean_columns"], stats["mode_columns"])
+        imputer.sums.update(stats["sums"])
+        imputer.counts.update(stats["counts"])
+        for col, pairs in stats["value_counts"].items():
+            imputer.value_counts[col] = Counter({v: n for v, n in pairs})
+        return imputer
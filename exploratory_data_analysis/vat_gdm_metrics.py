@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+
+#CLASSIFICATION METRICS
+#sensitivity: ability to identify GDM cases, true positive rate, TP/(TP+FN)
+#specificity: ability to identify non-GDM cases, true negative rate, TN/(TN+FP)
+#PPV (precision): TP/(TP+FP), NPV: TN/(TN+FN)
+#
+#The default 0.5 threshold gives all models a low sensitivity, so the metrics are computed at every
+#threshold at once: probabilities are sorted once and cumulative sums give the confusion matrix at each cut-off.
+#Several models (rows of a 2d array of out-of-fold probabilities) are swept together.
+
+
+def _ratio(num, den):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(den > 0, num / np.where(den > 0, den, 1), np.nan)
+
+
+def confusion_metrics(tp, fp, tn, fn):
+    """sensitivity, specificity, PPV, NPV and Youden's J from confusion matrix counts (scalars or arrays)"""
+    tp, fp, tn, fn = (np.asarray(v, dtype="float64") for v in (tp, fp, tn, fn))
+    sensitivity = _ratio(tp, tp + fn)
+    specificity = _ratio(tn, tn + fp)
+    return {
+        "sensitivity": sensitivity,
+        "specificity": specificity,
+        "ppv": _ratio(tp, tp + fp),
+        "npv": _ratio(tn, tn + fn),
+        "youden": sensitivity + specificity - 1,
+    }
+
+
+def classification_metrics(y_true, y_pred):
+    """metrics for predicted classes (e.g. out-of-fold predictions at the default threshold)"""
+    y_true = np.asarray(y_true).astype(bool)
+    y_pred = np.asarray(y_pred).astype(bool)
+    tp = np.sum(y_true & y_pred)
+    fp = np.sum(~y_true & y_pred)
+    tn = np.sum(~y_true & ~y_pred)
+    fn = np.sum(y_true & ~y_pred)
+    metrics = {key: float(value) for key, value in confusion_metrics(tp, fp, tn, fn).items()}
+    metrics.update({"tp": int(tp), "fp": int(fp), "tn": int(tn), "fn": int(fn)})
+    return metrics
+
+
+def threshold_sweep(y_true, probas):
+    """confusion matrix counts and metrics at every threshold, for one or more models
+
+    y_true: outcomes (0/1) for n participants, shape (n,) or the same shape as probas
+            (e.g. bootstrap resamples, where every row has its own outcomes)
+    probas: out-of-fold probabilities, shape (n,) for one model or (models, n)
+
+    A participant is predicted positive when its probability is >= the threshold.
+    Returns a dict of arrays with shape (models, n) (or (n,) for one model), sorted from the highest
+    threshold to the lowest. "valid" is False for positions inside a group of tied probabilities,
+    only the last position of a tie gives the counts for that threshold.
+    """
+    probas = np.asarray(probas, dtype="float64")
+    single = probas.ndim == 1
+    probas = np.atleast_2d(probas)
+    y_true = np.broadcast_to(np.atleast_2d(np.asarray(y_true).astype(bool)), probas.shape)
+
+    order = np.argsort(-probas, axis=1, kind="stable")
+    thresholds = np.take_along_axis(probas, order, axis=1)
+    positives = np.take_along_axis(y_true, order, axis=1)
+
+    #predicted positive = every participant up to and including this position
+    tp = np.cumsum(positives, axis=1)
+    fp = np.cumsum(~positives, axis=1)
+    n_pos = y_true.sum(axis=1, keepdims=True)
+    n_neg = y_true.shape[1] - n_pos
+    tn = n_neg - fp
+    fn = n_pos - tp
+
+    valid = np.ones_like(thresholds, dtype=bool)
+    valid[:, :-1] = thresholds[:, :-1] != thresholds[:, 1:]
+
+    sweep = {"threshold": thresholds, "tp": tp, "fp": fp, "tn": tn, "fn": fn, "valid": valid,
+             **confusion_metrics(tp, fp, tn, fn)}
+    if single:
+        sweep = {key: value[0] for key, value in sweep.items()}
+    return sweep
+
+
+def youden_optimal(y_true, probas, names=None):
+    """threshold maximizing sensitivity + specificity - 1 for each model, as a dataframe"""
+    probas = np.atleast_2d(np.asarray(probas, dtype="float64"))
+    sweep = threshold_sweep(y_true, probas)
+    youden = np.where(sweep["valid"], sweep["youden"], -np.inf)
+    best = np.argmax(youden, axis=1)
+    rows = np.arange(len(best))
+    table = pd.DataFrame({key: sweep[key][rows, best]
+                          for key in ["threshold", "sensitivity", "specificity", "ppv", "npv", "youden",
+                                      "tp", "fp", "tn", "fn"]})
+    table.index = names if names is not None else range(len(best))
+    return table
+
+
+def _curve_points(sweep):
+    """sweep counts with positions inside tied probabilities replaced by the point before the tie
+
+    The curve then goes straight from the point before a tie to the end of the tie, like sklearn's curves.
+    Returns tpr (= recall), fpr and precision with a (0, 0) starting point prepended.
+    """
+    tp, fp = sweep["tp"].astype("float64"), sweep["fp"].astype("float64")
+    n_pos = tp[:, -1:] + sweep["fn"][:, -1:]
+    n_neg = fp[:, -1:] + sweep["tn"][:, -1:]
+    positions = np.arange(tp.shape[1])
+    last_valid = np.maximum.accumulate(np.where(sweep["valid"], positions, -1), axis=1)
+    #shift by one so index 0 is the (0, 0) starting point
+    tp = np.take_along_axis(np.hstack([np.zeros((len(tp), 1)), tp]), last_valid + 1, axis=1)
+    fp = np.take_along_axis(np.hstack([np.zeros((len(fp), 1)), fp]), last_valid + 1, axis=1)
+    zeros = np.zeros((len(tp), 1))
+    tpr = np.hstack([zeros, _ratio(tp, n_pos)])
+    fpr = np.hstack([zeros, _ratio(fp, n_neg)])
+    precision = np.hstack([np.ones((len(tp), 1)), _ratio(tp, tp + fp)])
+    return tpr, fpr, precision
+
+
+def roc_auc_rows(y_true, probas):
+    """area under the ROC curve for every row of probas (and of y_true, if it is 2d)"""
+    sweep = threshold_sweep(y_true, np.atleast_2d(probas))
+    tpr, fpr, _ = _curve_points(sweep)
+    return np.sum(np.diff(fpr, axis=1) * (tpr[:, 1:] + tpr[:, :-1]) / 2, axis=1)
+
+
+def average_precision_rows(y_true, probas):
+    """average precision (sum of precision x recall increase) for every row of probas"""
+    sweep = threshold_sweep(y_true, np.atleast_2d(probas))
+    recall, _, precision = _curve_points(sweep)
+    return np.nansum(np.diff(recall, axis=1) * precision[:, 1:], axis=1)
+
+
+def metrics_at_threshold(y_true, probas, threshold=0.5):
+    """sensitivity, specificity, PPV and NPV for every row of probas at one threshold"""
+    probas = np.atleast_2d(np.asarray(probas, dtype="float64"))
+    y_true = np.broadcast_to(np.atleast_2d(np.asarray(y_true).astype(bool)), probas.shape)
+    predicted = probas >= threshold
+    return confusion_metrics(tp=np.sum(y_true & predicted, axis=1), fp=np.sum(~y_true & predicted, axis=1),
+                             tn=np.sum(~y_true & ~predicted, axis=1), fn=np.sum(y_true & ~predicted, axis=1))
@@ -7,11 +7,12 @@ Created on Thu Jan  4 14:20:41 2024
 """
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import cross_validate
-from sklearn.model_selection import cross_val_predict
-from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import confusion_matrix
+from exploratory_data_analysis.vat_gdm_schema import read_cleaned
+from exploratory_data_analysis.vat_gdm_evaluation import evaluate_models, gdm_pipeline
+from exploratory_data_analysis.vat_gdm_scoring import save_model_artifact
+from exploratory_data_analysis.vat_gdm_metrics import classification_metrics, threshold_sweep, youden_optimal
+from exploratory_data_analysis.vat_gdm_bootstrap import bootstrap_ci, repeated_cv_ci
 
 
 #Prediction Models
@@ -27,7 +28,7 @@ from sklearn.metrics import confusion_matrix
 
 #Just central fat
 
-data = pd.read_csv("gdm_vat_data_cleaned.csv")
+data = read_cleaned("datasets/gdm_vat_data_cleaned.parquet")
 data_copy = data
 
 #drop mean systolic blood pressure
@@ -54,34 +55,13 @@ data_copy = data_copy.drop(["mean_systolic_bp", "number"], axis=1)
 
 #DATA TRANSFORMATION
 #scaling data to standardize the features
-  
-def scaling_data(data, variable_list):
-    """scaling data for variables of choice"""
-
-    for var in variable_list:
-        #convert to numpy array
-        data_new = np.array(data[var])
-        #reshape data
-        data_new = data_new.reshape(-1,1)
-        #fit and transform data
-        scaled_data = StandardScaler().fit_transform(data_new)
-            
-        #update values in dataframe
-        data[var]=scaled_data.flatten()
-    
-    return data
-
-#remove variables in a nominal scale from being scaled
-data_to_scale = data_copy.drop(["gestational_dm", "type_of_delivery", "ethnicity"], axis=1)
-variables = data_to_scale.columns
-
-#scale data
-data_copy = scaling_data(data_copy,variables)
+#The scaler is part of the model pipeline (gdm_pipeline) so it is fit on the training folds only.
+#Numeric variables are scaled, variables in a nominal scale (type of delivery, ethnicity) are not.
 
 
 
 #LOGISTIC REGRESSION
-log_reg = LogisticRegression(random_state=123)
+log_reg = gdm_pipeline()
 
 
 
@@ -92,15 +72,6 @@ model_1= data_copy[["central_armellini_fat", "mean_diastolic_bp", "first_fasting
 model_1_x = model_1.iloc[:, :-1]
 model_1_y = model_1.iloc[:, -1]
 
-#cross validation
-model_1_scores = cross_validate(log_reg, model_1_x, model_1_y, cv=7, 
-                           scoring=["roc_auc", "average_precision"], return_train_score=True)
-
-#comparing prediced and actual y values, creating confusion matrix 
-y_predict_1 = cross_val_predict(log_reg, model_1_x, model_1_y, cv=7)
-conf_matrix_1 = confusion_matrix(model_1_y,y_predict_1)
-
-
 
 #MODEL 2
 model_2= data_copy[["age", "central_armellini_fat", "first_fasting_glucose", "bmi_pregestational", "gestational_dm"]]
@@ -108,15 +79,6 @@ model_2= data_copy[["age", "central_armellini_fat", "first_fasting_glucose", "bm
 model_2_x = model_2.iloc[:, :-1]
 model_2_y =model_2.iloc[:, -1]
 
-#cross validation
-model_2_scores = cross_validate(log_reg, model_2_x, model_2_y, cv=7, 
-                           scoring=["roc_auc", "average_precision"], return_train_score=True)
-
-
-#comparing prediced and actual y values, creating confusion matrix 
-y_predict_2 = cross_val_predict(log_reg, model_2_x, model_2_y, cv=7)
-conf_matrix_2 = confusion_matrix(model_2_y,y_predict_2)
-
 
 #Model 3
 model_3=data_copy[["central_armellini_fat", "first_fasting_glucose", "bmi_pregestational", "gestational_dm"]]
@@ -126,11 +88,24 @@ model_3_y = model_3.iloc[:, -1]
 
 
 #cross validation
-model_3_scores = cross_validate(log_reg, model_3_x, model_3_y, cv=7, 
-                           scoring=["roc_auc", "average_precision"], return_train_score=True)
+#each fold is fit once for both the scores and the predicted y values, all models and folds run in parallel
+results = evaluate_models({"model_1": (model_1_x, model_1_y),
+                           "model_2": (model_2_x, model_2_y),
+                           "model_3": (model_3_x, model_3_y)},
+                          log_reg, cv=7, scoring=["roc_auc", "average_precision"], n_jobs=-1)
+
+model_1_scores = results["model_1"]["scores"]
+model_2_scores = results["model_2"]["scores"]
+model_3_scores = results["model_3"]["scores"]
 
 #comparing prediced and actual y values, creating confusion matrix 
-y_predict_3 = cross_val_predict(log_reg, model_3_x, model_3_y, cv=7)
+y_predict_1 = results["model_1"]["y_pred"]
+conf_matrix_1 = confusion_matrix(model_1_y,y_predict_1)
+
+y_predict_2 = results["model_2"]["y_pred"]
+conf_matrix_2 = confusion_matrix(model_2_y,y_predict_2)
+
+y_predict_3 = results["model_3"]["y_pred"]
 conf_matrix_3 = confusion_matrix(model_3_y,y_predict_3)
 
 
@@ -164,35 +139,60 @@ average_prec_3 = np.average(model_3_scores["test_average_precision"])
 
 #sensitivity: ability to identify GDM cases, true positive rate
 #sensitivity = TP/(TP+FN)
+#specificity: ability to identify non-GDM cases, true negative rate
+#spcificity = TN/(TN+FP)
+#metrics at the default 0.5 threshold (out-of-fold predictions)
+metrics_1 = classification_metrics(model_1_y, y_predict_1)
+metrics_2 = classification_metrics(model_2_y, y_predict_2)
+metrics_3 = classification_metrics(model_3_y, y_predict_3)
 
 #model 1
-sensitivity_1 = conf_matrix_1[1,1]/(conf_matrix_1[1,1] + conf_matrix_1[1,0])
+sensitivity_1, specificity_1 = metrics_1["sensitivity"], metrics_1["specificity"]
 
 #model 2
-sensitivity_2 = conf_matrix_2[1,1]/(conf_matrix_2[1,1] + conf_matrix_2[1,0])
+sensitivity_2, specificity_2 = metrics_2["sensitivity"], metrics_2["specificity"]
 
 #model 3
-sensitivity_3 = conf_matrix_3[1,1]/(conf_matrix_3[1,1] + conf_matrix_3[1,0])
+sensitivity_3, specificity_3 = metrics_3["sensitivity"], metrics_3["specificity"]
 
 
-#specificity: ability to identify non-GDM cases, true negative rate
-#spcificity = TN/(TN+FP)
+#THRESHOLD TUNING
+#The 0.5 threshold is not a good cut-off for screening since GDM cases are rare in this cohort.
+#Sensitivity, specificity, PPV and NPV are computed at every threshold for all models at once
+#from the out-of-fold probabilities, and the threshold maximizing Youden's J is chosen for each model.
+oof_probas = np.vstack([results[name]["y_proba"] for name in ["model_1", "model_2", "model_3"]])
+threshold_sweeps = threshold_sweep(model_1_y, oof_probas)
+optimal_thresholds = youden_optimal(model_1_y, oof_probas, names=["model_1", "model_2", "model_3"])
 
-#model 1
-specificity_1 = conf_matrix_1[0,0]/(conf_matrix_1[0,0] + conf_matrix_1[0,1])
 
-#model 2
-specificity_2 = conf_matrix_2[0,0]/(conf_matrix_2[0,0] + conf_matrix_2[0,1])
+#CONFIDENCE INTERVALS
+#The sample is small (17 GDM cases), so the metrics above are uncertain.
+#95% confidence intervals from bootstrapping participants (out-of-fold probabilities, 0.5 threshold)
+#AUC of the pooled out-of-fold probabilities is lower than the mean fold AUC (0.77 vs 0.83 for model 1),
+#since probabilities from different folds' models are not on exactly the same scale.
+bootstrap_intervals = bootstrap_ci(model_1_y, oof_probas, names=["model_1", "model_2", "model_3"],
+                                   n_boot=2000, seed=123, n_jobs=-1)
 
-#model 3
-specificity_3 = conf_matrix_3[0,0]/(conf_matrix_3[0,0] + conf_matrix_3[0,1])
+#95% confidence intervals from repeating cross validation with differently shuffled folds
+cv_intervals = repeated_cv_ci({"model_1": (model_1_x, model_1_y),
+                               "model_2": (model_2_x, model_2_y),
+                               "model_3": (model_3_x, model_3_y)},
+                              log_reg, cv=7, n_repeats=10, seed=123, n_jobs=-1)
 
 
 #Summary:
 #Model 1 has the highest AUC at 0.83 and precision at 0.55.
 #However all models have a lowe sensitivity at 0.18. This is likely due to a low sample size of GDM cases.
+#At the Youden-optimal thresholds (optimal_thresholds) sensitivity is much higher, at the cost of specificity.
 
 
 #Overall, I would say Model 1 is the best of the three since it has the highest AUC and precision.
 #However, none of these Models have a strong ability to predict positive cases.
 
+
+#SAVING THE CHOSEN MODEL
+#Model 1 is refit on all participants and saved for the GDM risk scoring API in app.py (/api/score).
+final_model = gdm_pipeline().fit(model_1_x, model_1_y)
+save_model_artifact(final_model, "models/gdm_risk_model.json", features=list(model_1_x.columns),
+                    metrics={"cv_roc_auc": average_auc_1, "cv_average_precision": average_prec_1,
+                             "sensitivity": sensitivity_1, "specificity": specificity_1})
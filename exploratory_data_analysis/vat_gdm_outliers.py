@@ -0,0 +1,95 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from exploratory_data_analysis.vat_gdm_statistics import continuous_vars
+
+
+#OUTLIER DETECTION
+#Every continuous variable gets three outlier scores, each computed within the row's own group (e.g. GDM status):
+#- z_score: (value - mean)/sd, flagged when |z| > 3
+#- mad: robust z-score 0.6745*(value - median)/MAD, flagged when |score| > 3.5 (Iglewicz and Hoaglin),
+#  the median and MAD aren't pulled towards the outliers like the mean and sd are
+#- iqr: distance outside the boxplot fences (Q1, Q3) in IQR units, flagged when > 1.5 like the boxplot whiskers
+#The group statistics are computed in one broadcast over a (groups x rows x variables) array,
+#where values outside each group are masked as NaN, so there are no loops over variables or rows.
+
+methods = ["z_score", "mad", "iqr"]
+default_thresholds = {"z_score": 3.0, "mad": 3.5, "iqr": 1.5}
+
+
+def outlier_scores(data, variables=continuous_vars, group=None):
+    """z-scores, robust (MAD) z-scores and IQR fence distances for every row and variable
+
+    group: column whose values define the groups the statistics are computed in, None uses all rows
+    returns a dict of method -> (rows x variables) array, NaN for missing values and rows without a group
+    """
+    values = data[list(variables)].to_numpy(dtype="float64")
+    if len(values) == 0:
+        #nothing to score (e.g. a dashboard filter that keeps no participants)
+        return {method: np.empty((0, len(variables))) for method in methods}
+    if group is None:
+        codes, n_groups = np.zeros(len(data), dtype=int), 1
+    else:
+        codes, uniques = pd.factorize(data[group])
+        #at least one (empty) group, so rows without a group get NaN scores
+        n_groups = max(len(uniques), 1)
+
+    #(groups, rows, variables), values of other groups are masked
+    member = codes[None, :] == np.arange(n_groups)[:, None]
+    stacked = np.where(member[:, :, None], values[None, :, :], np.nan)
+    #empty groups/all-NaN columns and zero spreads give NaN/inf scores instead of warnings
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(stacked, axis=1)
+        sd = np.nanstd(stacked, axis=1, ddof=1)
+        q1, median, q3 = np.nanpercentile(stacked, [25, 50, 75], axis=1)
+        mad = np.nanmedian(np.abs(stacked - median[:, None, :]), axis=1)
+
+        #statistics of each row's own group, rows without a group get NaN
+        has_group = codes >= 0
+        def own(stat):
+            return np.where(has_group[:, None], stat[np.maximum(codes, 0)], np.nan)
+        mean, sd, q1, median, q3, mad = (own(stat) for stat in (mean, sd, q1, median, q3, mad))
+
+        iqr = q3 - q1
+        return {
+            "z_score": (values - mean) / sd,
+            "mad": 0.6745 * (values - median) / mad,
+            "iqr": np.clip(np.maximum((q1 - values) / iqr, (values - q3) / iqr), 0, None),
+        }
+
+
+def outlier_flags(data, variables=continuous_vars, group=None, method="iqr", threshold=None, scores=None):
+    """boolean dataframe with the same index as data, True where a value is an outlier within its group
+
+    scores: output of outlier_scores, to flag with several methods/thresholds without recomputing
+    """
+    if method not in default_thresholds:
+        raise ValueError(f"unknown outlier method {method}, expected one of {methods}")
+    threshold = default_thresholds[method] if threshold is None else threshold
+    scores = outlier_scores(data, variables, group) if scores is None else scores
+    with np.errstate(invalid="ignore"):
+        flags = np.abs(scores[method]) > threshold
+    return pd.DataFrame(flags, index=data.index, columns=list(variables))
+
+
+def outlier_report(data, variables=continuous_vars, group=None, method="iqr", threshold=None, id_column="number"):
+    """one row per flagged value: id, group, variable, value and score"""
+    scores = outlier_scores(data, variables, group)
+    flags = outlier_flags(data, variables, group, method, threshold, scores=scores).to_numpy()
+    rows, cols = np.nonzero(flags)
+    variables = np.asarray(list(variables))
+    report = pd.DataFrame({
+        "row": rows,
+        "variable": variables[cols],
+        "value": data[list(variables)].to_numpy(dtype="float64")[rows, cols],
+        "score": scores[method][rows, cols],
+    })
+    if group is not None:
+        report.insert(1, group, data[group].to_numpy()[rows])
+    if id_column in data.columns:
+        report.insert(1, id_column, data[id_column].to_numpy()[rows])
+    report["method"] = method
+    return report
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from exploratory_data_analysis.vat_gdm_statistics import adjust_p_values, continuous_vars
+
+
+#PERMUTATION TESTS
+#The t-tests assume normally distributed variables, which the histograms show isn't always the case
+#(e.g. gestational age at birth), and with 17 GDM participants the normal approximation is rough.
+#A permutation test makes no distribution assumption: the GDM labels are shuffled many times and the
+#difference between groups is recomputed, the p-value is the share of shuffles with a difference at least
+#as large as the observed one.
+#Each batch of shuffles is a (permutations x participants) label matrix, so the mean and median differences
+#of every continuous variable are computed for the whole batch at once, and batches run in parallel with joblib.
+#Every batch gets its own seed spawned from the main seed, so results don't depend on n_jobs.
+
+statistics = ["mean_difference", "median_difference"]
+
+
+def _group_means(labels, values, present):
+    """mean of every variable within the labelled rows, for every row of labels
+
+    labels: (permutations, n) 0/1 matrix, values: (n, variables) with NaN replaced by 0
+    present: (n, variables) 1 where the value isn't missing
+    """
+    return (labels @ values) / (labels @ present)
+
+
+def _group_medians(labels, sorted_values, order, counts):
+    """median of every variable within the labelled rows, for every row of labels
+
+    sorted_values/order: each variable's values sorted once (missing values last) and the sort order
+    counts: (permutations, variables) number of non-missing labelled values
+    The labels are put in each variable's sorted order, the cumulative sum then gives the rank of every
+    labelled value, so the middle value(s) can be looked up without sorting every permutation.
+    """
+    medians = np.empty(counts.shape)
+    lower_rank = (counts + 1) // 2
+    upper_rank = counts // 2 + 1
+    for j in range(sorted_values.shape[1]):
+        ranks = np.cumsum(labels[:, order[:, j]], axis=1)
+        lower = np.argmax(ranks >= lower_rank[:, j, None], axis=1)
+        upper = np.argmax(ranks >= upper_rank[:, j, None], axis=1)
+        medians[:, j] = (sorted_values[lower, j] + sorted_values[upper, j]) / 2
+    medians[counts == 0] = np.nan
+    return medians
+
+
+def _differences(labels, values, present, sorted_values, order):
+    """mean and median differences (labelled - other rows), shape (statistics, permutations, variables)"""
+    labels = labels.astype("float64")
+    others = 1 - labels
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_diff = _group_means(labels, values, present) - _group_means(others, values, present)
+    median_diff = (_group_medians(labels, sorted_values, order, labels @ present)
+                   - _group_medians(others, sorted_values, order, others @ present))
+    return np.stack([mean_diff, median_diff])
+
+
+def _permutation_batch(is_gdm, arrays, n_permutations, seed):
+    """differences for one batch of shuffled GDM labels"""
+    rng = np.random.default_rng(seed)
+    labels = rng.permuted(np.tile(is_gdm, (n_permutations, 1)), axis=1)
+    return _differences(labels, *arrays)
+
+
+def permutation_test(data, group="gestational_dm", positive=1, variables=continuous_vars, n_permutations=9999,
+                     alternative="two-sided", seed=123, batch_size=500, n_jobs=None, correction="fdr_bh",
+                     alpha=0.05):
+    """permutation p-values for the mean and median differences (GDM - non-GDM) of every variable
+
+    alternative: "two-sided", "greater" (GDM higher) or "less" (GDM lower)
+    p-values are (1 + shuffles at least as extreme)/(1 + n_permutations), so they are never 0,
+    and are adjusted for multiple testing within each statistic like compare_groups
+    """
+    if alternative not in ("two-sided", "greater", "less"):
+        raise ValueError(f"unknown alternative {alternative}")
+    variables = list(variables)
+    is_gdm = np.asarray(data[group] == positive)
+    raw = data[variables].to_numpy(dtype="float64")
+    present = (~np.isnan(raw)).astype("float64")
+    order = np.argsort(raw, axis=0, kind="stable")
+    arrays = (np.nan_to_num(raw), present, np.take_along_axis(raw, order, axis=0), order)
+
+    observed = _differences(is_gdm[None, :], *arrays)[:, 0, :]
+
+    sizes = [batch_size] * (n_permutations // batch_size) + ([n_permutations % batch_size] if n_permutations % batch_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    batches = Parallel(n_jobs=n_jobs)(
+        delayed(_permutation_batch)(is_gdm, arrays, size, batch_seed)
+        for size, batch_seed in zip(sizes, seeds)
+    )
+    null = np.concatenate(batches, axis=1)
+
+    #small tolerance so shuffles giving the same difference (up to rounding) count as extreme
+    tolerance = 1e-9 * np.maximum(np.abs(observed), 1)
+    if alternative == "two-sided":
+        extreme = np.abs(null) >= np.abs(observed)[:, None, :] - tolerance[:, None, :]
+    elif alternative == "greater":
+        extreme = null >= observed[:, None, :] - tolerance[:, None, :]
+    else:
+        extreme = null <= observed[:, None, :] + tolerance[:, None, :]
+    p_values = (1 + extreme.sum(axis=1)) / (1 + n_permutations)
+
+    results = pd.DataFrame({
+        "variable": np.tile(variables, len(statistics)),
+        "statistic": np.repeat(statistics, len(variables)),
+        "observed": observed.ravel(),
+        "p_value": p_values.ravel(),
+        "n_permutations": n_permutations,
+    })
+    results["p_adjusted"] = results.groupby("statistic")["p_value"].transform(
+        lambda p: adjust_p_values(p.to_numpy(), correction))
+    results["significant"] = results["p_adjusted"] < alpha
+    return results
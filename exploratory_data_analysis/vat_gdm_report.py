@@ -0,0 +1,156 @@
+import argparse
+import hashlib
+import html
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+#figures are rendered without a display, this has to be set before pyplot is imported
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import scipy
+import seaborn as sns
+
+from exploratory_data_analysis import vat_gdm_figures
+from exploratory_data_analysis.vat_gdm_figures import eda_figures
+from exploratory_data_analysis.vat_gdm_schema import as_codes, read_cleaned
+
+
+#EDA REPORT
+#Renders every EDA figure (vat_gdm_figures) headless with the Agg backend and saves them as png/svg,
+#along with an index.html showing all figures, so reports on refreshed data can run unattended.
+#Figures are rendered in parallel worker processes.
+#Each figure's data columns and arguments are hashed along with the source of the whole figures module
+#(figures share helpers and constants such as the colours) and the versions of the plotting libraries,
+#the hashes are saved in manifest.json and figures whose hash hasn't changed since the last run are skipped.
+
+#Usage (from the repository root):
+#python -m exploratory_data_analysis.vat_gdm_report --input datasets/gdm_vat_data_cleaned.parquet --output reports/eda --n-jobs 4
+
+manifest_name = "manifest.json"
+
+
+def load_report_data(path):
+    """cleaned data with the categorical columns as their 0/1 codes, like vat_gdm_eda"""
+    return as_codes(read_cleaned(path))
+
+
+def figure_columns(data, columns):
+    """the columns a figure depends on, in the order of the data"""
+    return [col for col in data.columns if col in columns]
+
+
+def plotting_code():
+    """source of the figures module and versions of the libraries that draw the figures"""
+    versions = {lib.__name__: lib.__version__ for lib in (matplotlib, sns, pd, np, scipy)}
+    return json.dumps(versions, sort_keys=True) + inspect.getsource(vat_gdm_figures)
+
+
+def figure_hash(name, data, formats, dpi):
+    """hash of what the saved figure depends on: data columns, arguments, figures module, library versions and output settings"""
+    _, _, kwargs, columns = eda_figures[name]
+    subset = data[figure_columns(data, columns)]
+    digest = hashlib.sha256()
+    digest.update(json.dumps([name, kwargs, sorted(formats), dpi, list(subset.columns),
+                              [str(dtype) for dtype in subset.dtypes]]).encode())
+    digest.update(plotting_code().encode())
+    digest.update(pd.util.hash_pandas_object(subset, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def render_figure(name, data, output_dir, formats, dpi=100):
+    """build one figure and save it in every format, returns the file names"""
+    _, func, kwargs, _ = eda_figures[name]
+    fig = func(data, **kwargs)
+    files = []
+    try:
+        for fmt in formats:
+            filename = f"{name}.{fmt}"
+            fig.savefig(os.path.join(output_dir, filename), format=fmt, dpi=dpi)
+            files.append(filename)
+    finally:
+        plt.close(fig)
+    return files
+
+
+def write_index(output_dir, manifest, source, formats):
+    """index.html with every figure, using the first format (png/svg) for the images"""
+    generated = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    sections = []
+    for name, (title, *_rest) in eda_figures.items():
+        if name not in manifest:
+            continue
+        files = manifest[name]["files"]
+        image = next((f for f in files if f.endswith("." + formats[0])), files[0])
+        links = " ".join(f'<a href="{html.escape(f)}">{html.escape(f.rsplit(".", 1)[1])}</a>' for f in files)
+        sections.append(f'<section id="{name}">\n<h2>{html.escape(title)}</h2>\n'
+                        f'<img src="{html.escape(image)}" alt="{html.escape(title)}">\n<p>{links}</p>\n</section>')
+    page = ("<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n<title>GDM EDA Report</title>\n"
+            "<style>body{font-family:sans-serif;max-width:1100px;margin:auto} img{max-width:100%}</style>\n"
+            "</head>\n<body>\n<h1>GDM EDA Report</h1>\n"
+            f"<p>Data: {html.escape(source)}, generated {generated}</p>\n"
+            + "\n".join(sections) + "\n</body>\n</html>\n")
+    with open(os.path.join(output_dir, "index.html"), "w") as file:
+        file.write(page)
+
+
+def build_report(input_path, output_dir, formats=("png",), n_jobs=1, force=False, dpi=100):
+    """render the EDA figures whose data changed, returns (rendered, skipped) figure names"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, manifest_name)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+
+    data = load_report_data(input_path)
+    hashes = {name: figure_hash(name, data, formats, dpi) for name in eda_figures}
+    #a figure is skipped if its hash is unchanged and its files are still there
+    todo = [name for name in eda_figures
+            if force or manifest.get(name, {}).get("hash") != hashes[name]
+            or not all(os.path.exists(os.path.join(output_dir, f)) for f in manifest[name]["files"])]
+    skipped = [name for name in eda_figures if name not in todo]
+
+    #each worker only gets the columns its figure uses
+    jobs = {name: data[figure_columns(data, eda_figures[name][3])] for name in todo}
+    if n_jobs == 1 or len(todo) <= 1:
+        results = {name: render_figure(name, subset, output_dir, formats, dpi) for name, subset in jobs.items()}
+    else:
+        n_jobs = n_jobs if n_jobs > 0 else os.cpu_count()
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(todo))) as pool:
+            futures = {name: pool.submit(render_figure, name, subset, output_dir, formats, dpi)
+                       for name, subset in jobs.items()}
+            results = {name: future.result() for name, future in futures.items()}
+
+    #figures that are no longer defined are dropped from the manifest
+    manifest = {name: manifest[name] for name in skipped}
+    for name, files in results.items():
+        manifest[name] = {"hash": hashes[name], "files": files}
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file, indent=2)
+    write_index(output_dir, manifest, input_path, list(formats))
+    return todo, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the EDA figures to png/svg files and an html index.")
+    parser.add_argument("--input", default="datasets/gdm_vat_data_cleaned.parquet", help="cleaned data file")
+    parser.add_argument("--output", default="reports/eda", help="directory for the figures and index.html")
+    parser.add_argument("--formats", nargs="+", default=["png"], choices=["png", "svg"], help="image formats")
+    parser.add_argument("--n-jobs", type=int, default=1, help="worker processes, -1 uses all cores")
+    parser.add_argument("--dpi", type=int, default=100, help="resolution of png files")
+    parser.add_argument("--force", action="store_true", help="render every figure even if its data hasn't changed")
+    args = parser.parse_args(argv)
+
+    rendered, skipped = build_report(args.input, args.output, formats=args.formats, n_jobs=args.n_jobs,
+                                     force=args.force, dpi=args.dpi)
+    print(f"Rendered {len(rendered)} figures, skipped {len(skipped)} unchanged, saved to {args.output}/index.html")
+
+
+if __name__ == "__main__":
+    main()
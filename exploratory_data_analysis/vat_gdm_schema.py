@@ -0,0 +1,130 @@
+import os
+
+import pandas as pd
+
+
+#SCHEMA FOR THE CLEANED DATASET
+#Reading the cleaned csv back in lets pandas guess the types (e.g. ethnicity and pregnancies come back as float64).
+#The cleaned dataset is saved as parquet with these types so every script loads the same, compact columns.
+
+#nominal variables, stored as categoricals of their 0/1 codes
+binary_category = pd.CategoricalDtype(categories=[0, 1])
+
+cleaned_schema = {
+    "number": "int32",
+    "age": "int8",
+    "ethnicity": binary_category,
+    "mean_diastolic_bp": "float32",
+    "mean_systolic_bp": "float32",
+    "central_armellini_fat": "float32",
+    "current_gestational_age": "float32",
+    "pregnancies": "int8",
+    "first_fasting_glucose": "float32",
+    "bmi_pregestational": "float32",
+    "gestational_age_at_birth": "float32",
+    "type_of_delivery": binary_category,
+    "child_birth_weight": "int16",
+    "gestational_dm": binary_category,
+}
+
+#labels of the nominal variables' codes, shown in the app and accepted by the risk scoring api
+category_labels = {
+    "ethnicity": {0: "Non-White", 1: "White"},
+    "type_of_delivery": {0: "Vaginal", 1: "C-section"},
+    "gestational_dm": {0: "Non-GDM", 1: "GDM"},
+}
+
+
+def apply_schema(data):
+    """cast the cleaned dataset to the types in cleaned_schema"""
+    missing = [col for col in cleaned_schema if col not in data.columns]
+    if missing:
+        raise ValueError(f"cleaned dataset is missing columns: {missing}")
+    #integer codes are needed before converting to categoricals (csv gives e.g. 1.0 instead of 1)
+    data = data.astype({col: "int64" for col, dtype in cleaned_schema.items()
+                        if dtype is binary_category and data[col].dtype.kind == "f"})
+    return data.astype(cleaned_schema)
+
+
+def as_codes(data):
+    """the nominal variables as plain 0/1 integers instead of categoricals, for the EDA figures and tests"""
+    return data.astype({col: "int64" for col, dtype in cleaned_schema.items()
+                        if dtype is binary_category and col in data.columns})
+
+
+def write_cleaned(data, path):
+    """save the cleaned dataset with its schema, the format is chosen from the file extension"""
+    data = apply_schema(data)
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".pq"):
+        data.to_parquet(path, index=False)
+    elif ext in (".feather", ".arrow"):
+        data.to_feather(path)
+    elif ext == ".csv":
+        data.to_csv(path, index=False)
+    else:
+        raise ValueError(f"unsupported output file {path}")
+
+
+def read_cleaned(path):
+    """load the cleaned dataset and cast it to the schema"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".pq"):
+        data = pd.read_parquet(path)
+    elif ext in (".feather", ".arrow"):
+        data = pd.read_feather(path)
+    elif ext == ".csv":
+        data = pd.read_csv(path)
+    else:
+        raise ValueError(f"unsupported input file {path}")
+    #parquet doesn't keep categoricals of integer codes, so the schema is applied on every read
+    return apply_schema(data)
+
+
+class CleanedWriter:
+    """write the cleaned dataset one chunk at a time, so large files never have to be held in memory
+
+    Usage:
+        with CleanedWriter("cleaned.parquet") as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.ext = os.path.splitext(path)[1].lower()
+        if self.ext not in (".parquet", ".pq", ".feather", ".arrow", ".csv"):
+            raise ValueError(f"unsupported output file {path}")
+        self._writer = None
+        self._header = True
+
+    def write(self, chunk):
+        chunk = apply_schema(chunk)
+        if self.ext == ".csv":
+            chunk.to_csv(self.path, index=False, mode="w" if self._header else "a", header=self._header)
+            self._header = False
+            return
+        import pyarrow as pa
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._writer is None:
+            if self.ext in (".parquet", ".pq"):
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                self._writer = pa.ipc.new_file(self.path, table.schema)
+        #every chunk has the same arrow schema since the categories are fixed in cleaned_schema
+        if self.ext in (".parquet", ".pq"):
+            self._writer.write_table(table)
+        else:
+            self._writer.write(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,128 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+#GDM RISK SCORING
+#The chosen model (scaler + logistic regression) is saved as a json artifact with its scaler means/scales
+#and coefficients. Scoring only needs numpy: the scaling is folded into the coefficients, so the risk
+#for a batch of records is one dot product and a sigmoid. sklearn is not imported here.
+#Nominal features are scored by their 0/1 codes, the artifact also keeps their labels (e.g. "C-section")
+#so records can send either.
+
+#bump when the artifact layout changes
+ARTIFACT_VERSION = 1
+
+
+def save_model_artifact(pipeline, path, features, metrics=None):
+    """save a fitted gdm_pipeline (scaler + logistic regression) as a json artifact
+
+    features: input columns in the order the pipeline was fit with
+    metrics: optional cross validation results to keep with the model
+    """
+    #imported here so scoring with RiskModel stays numpy-only
+    from exploratory_data_analysis.vat_gdm_schema import category_labels
+
+    scaler = pipeline.named_steps["scaler"]
+    log_reg = pipeline.named_steps["log_reg"]
+    #the column transformer outputs the scaled columns first, then the passed through (nominal) columns
+    output_names = list(scaler.get_feature_names_out())
+    coefficients = dict(zip(output_names, log_reg.coef_[0].tolist()))
+
+    mean = {var: 0.0 for var in features}
+    scale = {var: 1.0 for var in features}
+    for name, transformer, columns in scaler.transformers_:
+        if name == "scale":
+            mean.update(zip(columns, transformer.mean_.tolist()))
+            scale.update(zip(columns, transformer.scale_.tolist()))
+
+    params = {
+        "features": list(features),
+        "mean": [mean[var] for var in features],
+        "scale": [scale[var] for var in features],
+        "coefficients": [coefficients[var] for var in features],
+        "intercept": float(log_reg.intercept_[0]),
+    }
+    artifact = {
+        "artifact_version": ARTIFACT_VERSION,
+        #model version changes whenever the fitted parameters change
+        "model_version": hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12],
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "model": "logistic_regression",
+        "outcome": "gestational_dm",
+        **params,
+        #label -> code of the nominal features, not part of the model version since the fit doesn't change
+        "categories": {var: {label: code for code, label in category_labels[var].items()}
+                       for var in features if var in category_labels},
+        "metrics": metrics or {},
+    }
+    with open(path, "w") as f:
+        json.dump(artifact, f, indent=2)
+    return artifact
+
+
+class RiskModel:
+    """numpy-only scorer loaded from a model artifact"""
+
+    def __init__(self, artifact):
+        if artifact.get("artifact_version") != ARTIFACT_VERSION:
+            raise ValueError(f"unsupported model artifact version {artifact.get('artifact_version')}, "
+                             f"expected {ARTIFACT_VERSION}")
+        self.artifact = artifact
+        self.features = artifact["features"]
+        self.model_version = artifact["model_version"]
+        #artifacts saved before labels were stored only accept codes
+        self.categories = artifact.get("categories", {})
+        mean = np.asarray(artifact["mean"], dtype="float64")
+        scale = np.asarray(artifact["scale"], dtype="float64")
+        coefficients = np.asarray(artifact["coefficients"], dtype="float64")
+        #((x - mean)/scale) @ coef + intercept  ==  x @ (coef/scale) + (intercept - sum(coef*mean/scale))
+        self.weights = coefficients / scale
+        self.bias = artifact["intercept"] - float(np.sum(coefficients * mean / scale))
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def predict_proba(self, x):
+        """probability of GDM for a 2d array with columns in the order of self.features"""
+        x = np.asarray(x, dtype="float64")
+        if x.ndim != 2 or x.shape[1] != len(self.features):
+            raise ValueError(f"expected {len(self.features)} columns: {self.features}")
+        z = x @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def _code(self, var, value):
+        """code of a nominal feature's label, other values are returned unchanged"""
+        if isinstance(value, str) and var in self.categories:
+            if value not in self.categories[var]:
+                raise ValueError(f"unknown {var} {value!r}, expected one of {list(self.categories[var])} "
+                                 f"or their codes {list(self.categories[var].values())}")
+            return self.categories[var][value]
+        return value
+
+    def records_to_array(self, records):
+        """convert a list of dicts (one per patient) to an array in feature order"""
+        missing = sorted({var for record in records for var in self.features if record.get(var) is None})
+        if missing:
+            raise ValueError(f"missing values for: {missing}")
+        values = np.array([[self._code(var, record[var]) for var in self.features] for record in records],
+                          dtype="float64")
+        #NaN/inf (json NaN, csv "nan" or "inf") would give a NaN probability, which isn't valid json either
+        not_finite = [var for var, finite in zip(self.features, np.isfinite(values).all(axis=0)) if not finite]
+        if not_finite:
+            raise ValueError(f"values must be finite numbers for: {not_finite}")
+        return values
+
+    def score_records(self, records):
+        return self.predict_proba(self.records_to_array(records))
+
+    def score_frame(self, data):
+        """probability of GDM for every row of a dataframe"""
+        missing = [var for var in self.features if var not in data.columns]
+        if missing:
+            raise ValueError(f"missing columns: {missing}")
+        return self.predict_proba(np.column_stack([np.asarray(data[var], dtype="float64") for var in self.features]))
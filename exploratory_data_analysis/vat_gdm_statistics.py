@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import chi2_contingency, f, fisher_exact, mannwhitneyu, ttest_ind
+
+
+#TESTS TO COMPARE VARIABLES BETWEEN NON-GDM AND GDM GROUPS
+#compare_groups runs every test for every variable at once and returns one tidy table:
+#- F-test comparing variances (two-sided)
+#- t-test: Student's t-test, or Welch's t-test when the F-test finds different variances
+#- Mann-Whitney U test, which doesn't assume a normal distribution
+#- chi-square test for categorical variables, or Fisher's exact test when expected counts are below 5
+#p-values are adjusted for multiple testing within each test (Benjamini-Hochberg by default).
+
+continuous_vars = ["mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat",
+                   "first_fasting_glucose", "bmi_pregestational", "child_birth_weight",
+                   "gestational_age_at_birth", "current_gestational_age", "age"]
+categorical_vars = ["ethnicity", "pregnancies", "type_of_delivery"]
+#pregnancies is split into two groups: less than/equal 3 and greater than 3
+split_at = {"pregnancies": 3}
+
+
+def adjust_p_values(p_values, method="fdr_bh"):
+    """adjust p-values for multiple testing: "fdr_bh" (Benjamini-Hochberg), "holm", "bonferroni" or "none" """
+    p = np.asarray(p_values, dtype="float64")
+    n = p.size
+    if n == 0 or method == "none":
+        return p
+    if method == "bonferroni":
+        return np.minimum(p * n, 1.0)
+    order = np.argsort(p)
+    ranked = p[order]
+    if method == "holm":
+        adjusted = np.maximum.accumulate(ranked * (n - np.arange(n)))
+    elif method == "fdr_bh":
+        adjusted = np.minimum.accumulate((ranked * n / np.arange(1, n + 1))[::-1])[::-1]
+    else:
+        raise ValueError(f"unknown correction method {method}")
+    result = np.empty(n)
+    result[order] = np.minimum(adjusted, 1.0)
+    return result
+
+
+def _continuous_tests(gdm, non_gdm, variables, alpha):
+    """F-test, Student/Welch t-test and Mann-Whitney for all continuous variables at once"""
+    x = gdm[variables].to_numpy(dtype="float64")
+    y = non_gdm[variables].to_numpy(dtype="float64")
+    n_x = np.sum(~np.isnan(x), axis=0)
+    n_y = np.sum(~np.isnan(y), axis=0)
+
+    #F value = variance_1/variance_2, two-sided p-value
+    f_stat = np.nanvar(x, axis=0, ddof=1) / np.nanvar(y, axis=0, ddof=1)
+    f_p = np.minimum(2 * np.minimum(f.cdf(f_stat, n_x - 1, n_y - 1), f.sf(f_stat, n_x - 1, n_y - 1)), 1.0)
+
+    #both t-tests are computed for every variable, Welch's is used where variances differ
+    student = ttest_ind(x, y, axis=0, nan_policy="omit")
+    welch = ttest_ind(x, y, axis=0, equal_var=False, nan_policy="omit")
+    unequal = f_p < alpha
+    t_stat = np.where(unequal, welch.statistic, student.statistic)
+    t_p = np.where(unequal, welch.pvalue, student.pvalue)
+
+    mann_whitney = mannwhitneyu(x, y, axis=0, nan_policy="omit")
+
+    summary = {
+        "mean_gdm": np.nanmean(x, axis=0), "mean_non_gdm": np.nanmean(y, axis=0),
+        "median_gdm": np.nanmedian(x, axis=0), "median_non_gdm": np.nanmedian(y, axis=0),
+    }
+    tests = [
+        ("f_test", np.full(len(variables), "f_test", dtype=object), f_stat, f_p),
+        ("t_test", np.where(unequal, "welch_t_test", "student_t_test"), t_stat, t_p),
+        ("mann_whitney", np.full(len(variables), "mann_whitney", dtype=object),
+         np.asarray(mann_whitney.statistic), np.asarray(mann_whitney.pvalue)),
+    ]
+    frames = []
+    for family, names, stat, p in tests:
+        frames.append(pd.DataFrame({"variable": variables, "family": family, "test": names,
+                                    "statistic": stat, "p_value": p, **summary}))
+    return frames
+
+
+def _categorical_tests(data, is_gdm, variables):
+    """chi-square (or Fisher's exact) test for each categorical variable"""
+    rows = []
+    for var in variables:
+        values = data[var]
+        if var in split_at:
+            values = np.where(values > split_at[var], f"> {split_at[var]}", f"<= {split_at[var]}")
+        #contingency table: categories x (non-GDM, GDM)
+        table = pd.crosstab(np.asarray(values), is_gdm).to_numpy()
+        stat, p, dof, expected = chi2_contingency(table)
+        test = "chi_square"
+        if table.shape == (2, 2) and (expected < 5).any():
+            stat, p = fisher_exact(table)
+            test = "fisher_exact"
+        rows.append({"variable": var, "family": "categorical", "test": test, "statistic": stat, "p_value": p})
+    return pd.DataFrame(rows)
+
+
+def compare_groups(data, group="gestational_dm", positive=1, continuous=continuous_vars,
+                   categorical=categorical_vars, alpha=0.05, correction="fdr_bh"):
+    """compare GDM and non-GDM groups for every variable, returning one row per variable and test"""
+    is_gdm = np.asarray(data[group] == positive)
+    gdm = data.loc[is_gdm]
+    non_gdm = data.loc[~is_gdm]
+
+    frames = _continuous_tests(gdm, non_gdm, list(continuous), alpha) if len(continuous) else []
+    if len(categorical):
+        frames.append(_categorical_tests(data, is_gdm, list(categorical)))
+    results = pd.concat(frames, ignore_index=True)
+
+    results["p_adjusted"] = results.groupby("family")["p_value"].transform(
+        lambda p: adjust_p_values(p.to_numpy(), correction))
+    results["significant"] = results["p_adjusted"] < alpha
+    return results
@@ -0,0 +1,208 @@
+import argparse
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, effective_n_jobs
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import average_precision_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.preprocessing import StandardScaler
+
+from exploratory_data_analysis.vat_gdm_schema import read_cleaned
+
+
+#FEATURE SUBSET SEARCH
+#The modelling script compares three hand-picked feature sets.
+#This searches every combination of the candidate predictors (or a beam-limited forward search)
+#with cross validated AUC and average precision, and ranks them in a leaderboard.
+
+#Usage (from the repository root):
+#python -m exploratory_data_analysis.vat_gdm_subset_search --n-jobs -1 --top 20
+
+#Speed ups:
+#- fold splits and scaled train/test matrices are computed once and reused by every subset,
+#  the scaler works column by column so slicing the scaled matrix is the same as scaling the subset
+#- subsets are evaluated in batches in parallel with joblib
+#- a subset stops being evaluated once the remaining folds can't lift its AUC into the leaderboard
+#  (or, in the beam search, into the subsets of its size that are expanded next)
+
+#all predictors in the cleaned dataset
+candidate_predictors = ["age", "ethnicity", "mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat",
+                        "current_gestational_age", "pregnancies", "first_fasting_glucose", "bmi_pregestational",
+                        "gestational_age_at_birth", "type_of_delivery", "child_birth_weight"]
+
+
+class FoldCache:
+    """fold splits and scaled matrices for every candidate predictor, computed once"""
+
+    def __init__(self, data, predictors, outcome="gestational_dm", cv=7):
+        self.predictors = list(predictors)
+        self.index = {var: i for i, var in enumerate(self.predictors)}
+        x = data[self.predictors]
+        y = np.asarray(data[outcome]).astype(int)
+        #nominal variables (categoricals in the cleaned schema) are not scaled
+        numeric = [i for i, var in enumerate(self.predictors) if not isinstance(x[var].dtype, pd.CategoricalDtype)]
+        x = x.apply(lambda col: np.asarray(col, dtype="float64")).to_numpy()
+
+        self.folds = []
+        for train_idx, test_idx in StratifiedKFold(n_splits=cv).split(x, y):
+            x_train, x_test = x[train_idx].copy(), x[test_idx].copy()
+            scaler = StandardScaler().fit(x_train[:, numeric])
+            x_train[:, numeric] = scaler.transform(x_train[:, numeric])
+            x_test[:, numeric] = scaler.transform(x_test[:, numeric])
+            self.folds.append((x_train, x_test, y[train_idx], y[test_idx]))
+
+    def columns(self, features):
+        return [self.index[var] for var in features]
+
+
+def evaluate_subset(cache, features, threshold=-np.inf, **log_reg_params):
+    """cross validated AUC/average precision for one subset, None if it is pruned
+
+    threshold: AUC the subset has to be able to reach to get into the leaderboard
+    """
+    cols = cache.columns(features)
+    n_folds = len(cache.folds)
+    aucs, precisions = [], []
+    for x_train, x_test, y_train, y_test in cache.folds:
+        model = LogisticRegression(**{"random_state": 123, **log_reg_params})
+        model.fit(x_train[:, cols], y_train)
+        score = model.decision_function(x_test[:, cols])
+        aucs.append(roc_auc_score(y_test, score))
+        precisions.append(average_precision_score(y_test, score))
+        #best possible mean AUC if every remaining fold scored 1
+        if (sum(aucs) + (n_folds - len(aucs))) / n_folds < threshold:
+            return None
+    return {
+        "features": tuple(features),
+        "n_features": len(features),
+        "roc_auc": np.mean(aucs),
+        "roc_auc_std": np.std(aucs),
+        "average_precision": np.mean(precisions),
+    }
+
+
+def evaluate_batch(cache, batch, threshold, **log_reg_params):
+    results = [evaluate_subset(cache, features, threshold, **log_reg_params) for features in batch]
+    return [result for result in results if result is not None]
+
+
+class SubsetSearch:
+    """ranked search over feature subsets
+
+    top: number of subsets kept in the leaderboard, also used for pruning (None keeps and fully evaluates every subset)
+    """
+
+    def __init__(self, data, predictors=candidate_predictors, cv=7, top=50, n_jobs=None, batch_size=64,
+                 **log_reg_params):
+        self.cache = FoldCache(data, predictors, cv=cv)
+        self.predictors = list(predictors)
+        self.top = top
+        self.n_jobs = n_jobs
+        self.batch_size = batch_size
+        self.log_reg_params = log_reg_params
+        self.results = []
+
+    @staticmethod
+    def _kth_best(results, k):
+        """AUC of the k-th best result, -inf while there are fewer than k (or k is None)"""
+        if k is None or len(results) < k:
+            return -np.inf
+        return sorted((r["roc_auc"] for r in results), reverse=True)[k - 1]
+
+    def _threshold(self, found=(), keep=None):
+        """AUC a subset has to be able to reach to get into the leaderboard or the best keep subsets of found"""
+        threshold = self._kth_best(self.results, self.top)
+        return threshold if keep is None else min(threshold, self._kth_best(found, keep))
+
+    def _run(self, subsets, parallel, keep=None):
+        """evaluate subsets in waves of batches, updating the pruning threshold between waves
+
+        keep: number of best subsets of this run that must be fully evaluated (the beam search expands them)
+        """
+        subsets = list(subsets)
+        batches = [subsets[i:i + self.batch_size] for i in range(0, len(subsets), self.batch_size)]
+        #one batch on its own first, so the other batches are pruned against its results
+        wave_size = effective_n_jobs(self.n_jobs)
+        waves = [batches[:1]] + [batches[i:i + wave_size] for i in range(1, len(batches), wave_size)]
+        found = []
+        for wave in waves:
+            threshold = self._threshold(found, keep)
+            wave_results = parallel(delayed(evaluate_batch)(self.cache, batch, threshold, **self.log_reg_params)
+                                     for batch in wave)
+            for results in wave_results:
+                found.extend(results)
+                self.results.extend(results)
+        return found
+
+    def exhaustive(self, min_features=1, max_features=None):
+        """evaluate every combination of the predictors"""
+        max_features = max_features or len(self.predictors)
+        subsets = (combo for k in range(min_features, max_features + 1)
+                   for combo in combinations(self.predictors, k))
+        with Parallel(n_jobs=self.n_jobs) as parallel:
+            self._run(subsets, parallel)
+        return self.leaderboard()
+
+    def beam(self, beam_width=10, max_features=None):
+        """best-first forward search, keeping the best beam_width subsets of each size"""
+        max_features = max_features or len(self.predictors)
+        frontier = [()]
+        seen = set()
+        with Parallel(n_jobs=self.n_jobs) as parallel:
+            for _ in range(max_features):
+                candidates = []
+                for subset in frontier:
+                    for var in self.predictors:
+                        if var in subset:
+                            continue
+                        new = tuple(sorted(subset + (var,), key=self.predictors.index))
+                        if new not in seen:
+                            seen.add(new)
+                            candidates.append(new)
+                if not candidates:
+                    break
+                #subsets pruned here could be neither in the leaderboard nor in the next frontier
+                found = self._run(candidates, parallel, keep=beam_width)
+                found.sort(key=lambda r: r["roc_auc"], reverse=True)
+                frontier = [r["features"] for r in found[:beam_width]]
+        return self.leaderboard()
+
+    def leaderboard(self):
+        """subsets ranked by mean cross validated AUC"""
+        board = pd.DataFrame(self.results, columns=["features", "n_features", "roc_auc", "roc_auc_std",
+                                                    "average_precision"])
+        board = board.sort_values(["roc_auc", "average_precision"], ascending=False, ignore_index=True)
+        if self.top is not None:
+            board = board.head(self.top)
+        board["features"] = board["features"].map(", ".join)
+        return board
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank feature subsets for the GDM logistic regression model.")
+    parser.add_argument("--data", default="datasets/gdm_vat_data_cleaned.parquet", help="cleaned dataset")
+    parser.add_argument("--mode", choices=["exhaustive", "beam"], default="exhaustive")
+    parser.add_argument("--beam-width", type=int, default=10)
+    parser.add_argument("--max-features", type=int, default=None)
+    parser.add_argument("--top", type=int, default=20, help="number of subsets in the leaderboard")
+    parser.add_argument("--cv", type=int, default=7, help="number of cross validation folds")
+    parser.add_argument("--n-jobs", type=int, default=None, help="parallel workers, -1 uses all cores")
+    parser.add_argument("--output", default=None, help="save the leaderboard to this csv file")
+    args = parser.parse_args(argv)
+
+    search = SubsetSearch(read_cleaned(args.data), cv=args.cv, top=args.top, n_jobs=args.n_jobs)
+    if args.mode == "exhaustive":
+        board = search.exhaustive(max_features=args.max_features)
+    else:
+        board = search.beam(beam_width=args.beam_width, max_features=args.max_features)
+
+    if args.output:
+        board.to_csv(args.output, index=False)
+    with pd.option_context("display.max_colwidth", None, "display.width", 200):
+        print(board)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm, rankdata
+
+from exploratory_data_analysis.vat_gdm_data_cleaning import clean_column_names, clean_data, new_imputer
+from exploratory_data_analysis.vat_gdm_schema import CleanedWriter, apply_schema
+
+
+#SYNTHETIC COHORTS
+#The study has 132 participants, too few to measure how the app and the pipelines scale.
+#CohortModel learns the shape of the raw study file and generates cohorts of any size with:
+#- the raw schema: same column names and order, "weeks,days" gestational ages and the same missingness rates
+#- or the cleaned schema, by running the generated raw data through the cleaning pipeline
+#Continuous variables are sampled per GDM group from a gaussian copula: correlated normal scores are mapped
+#through each variable's quantiles, so the skewed distributions (e.g. preterm births), the ranges and the
+#correlations between variables of the study are kept. Discrete variables are sampled from their frequencies.
+#The model only keeps quantiles, correlations and frequencies, it can be saved as json without the raw rows.
+
+#Usage (from the repository root):
+#python -m exploratory_data_analysis.vat_gdm_synthetic --rows 1000000 --kind raw --output datasets/synthetic_raw.csv
+#python -m exploratory_data_analysis.vat_gdm_synthetic --rows 1000000 --kind cleaned --output datasets/synthetic_cleaned.parquet
+
+continuous = ["age", "mean_diastolic_bp", "mean_systolic_bp", "central_armellini_fat", "current_gestational_age",
+              "first_fasting_glucose", "bmi_pregestational", "gestational_age_at_birth", "child_birth_weight"]
+discrete = ["ethnicity", "pregnancies", "type_of_delivery"]
+#gestational ages are modelled in days, the raw file has them as "weeks,days"
+gestational_ages = ["current_gestational_age", "gestational_age_at_birth"]
+n_quantiles = 201
+
+
+def weeks_days_to_days(values):
+    """"weeks,days" strings to total days (NaN for malformed values)"""
+    parts = pd.Series(values).astype("string").str.strip().str.extract(r"^(\d+)\s*,\s*(\d+)$")
+    return (pd.to_numeric(parts[0]) * 7 + pd.to_numeric(parts[1])).to_numpy(dtype="float64")
+
+
+def days_to_weeks_days(days):
+    """total days to "weeks,days" strings"""
+    days = np.round(days).astype(np.int64)
+    return pd.Series(days // 7).astype(str).str.cat(pd.Series(days % 7).astype(str), sep=",").to_numpy()
+
+
+def _decimals(values):
+    """number of decimals used in a column, up to 2"""
+    values = values[~np.isnan(values)]
+    for decimals in range(3):
+        if np.allclose(values, np.round(values, decimals)):
+            return decimals
+    return 2
+
+
+def _nearest_correlation(corr):
+    """closest valid correlation matrix (pairwise correlations of incomplete data may not be positive definite)"""
+    corr = np.nan_to_num(corr, nan=0.0)
+    values, vectors = np.linalg.eigh((corr + corr.T) / 2)
+    corr = vectors @ np.diag(np.clip(values, 1e-6, None)) @ vectors.T
+    scale = np.sqrt(np.diag(corr))
+    return corr / np.outer(scale, scale)
+
+
+class CohortModel:
+    """generator of synthetic raw or cleaned cohorts, fitted on the raw study file"""
+
+    def __init__(self, params):
+        self.params = params
+
+    @classmethod
+    def fit(cls, raw):
+        """learn quantiles, correlations, frequencies and missingness from the raw study data"""
+        names = dict(zip(raw.columns, clean_column_names(raw.columns)))
+        data = raw.rename(columns=names)
+        for var in gestational_ages:
+            data[var] = weeks_days_to_days(data[var])
+
+        groups = {}
+        for status, group in data.groupby("gestational_dm"):
+            values = group[continuous].to_numpy(dtype="float64")
+            #normal scores of the ranks, their (pairwise) correlation is the copula correlation
+            scores = pd.DataFrame(norm.ppf(rankdata(values, axis=0, nan_policy="omit") / (len(values) + 1)))
+            groups[str(int(status))] = {
+                "quantiles": np.nanquantile(values, np.linspace(0, 1, n_quantiles), axis=0).T.tolist(),
+                "correlation": _nearest_correlation(scores.corr().to_numpy()).tolist(),
+                "frequencies": {var: {str(k): v for k, v in group[var].value_counts(normalize=True).items()}
+                                for var in discrete},
+            }
+
+        return cls({
+            "raw_columns": list(raw.columns),
+            "clean_columns": [names[col] for col in raw.columns],
+            "gdm_rate": float(data["gestational_dm"].mean()),
+            "diabetes_mellitus_rate": float(data["diabetes_mellitus"].mean()),
+            "missing_rates": {names[col]: float(rate) for col, rate in raw.isna().mean().items() if rate > 0},
+            "decimals": {var: _decimals(data[var].to_numpy(dtype="float64")) for var in continuous},
+            "groups": groups,
+        })
+
+    @classmethod
+    def from_csv(cls, path):
+        return cls.fit(pd.read_csv(path))
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.params, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def _sample_group(self, group, n, rng):
+        """continuous and discrete values for n participants of one GDM group"""
+        params = self.params["groups"][group]
+        quantiles = np.asarray(params["quantiles"])
+        #correlated uniform values, mapped through each variable's quantiles
+        uniform = norm.cdf(rng.multivariate_normal(np.zeros(len(continuous)), params["correlation"], size=n,
+                                                   method="cholesky"))
+        grid = np.linspace(0, 1, quantiles.shape[1])
+        sample = {var: np.interp(uniform[:, j], grid, quantiles[j]) for j, var in enumerate(continuous)}
+        for var in discrete:
+            freq = params["frequencies"][var]
+            sample[var] = rng.choice(np.asarray(list(freq), dtype="float64").astype(np.int64), size=n,
+                                     p=np.asarray(list(freq.values())) / sum(freq.values()))
+        return sample
+
+    def generate_raw(self, n, seed=None, start=1, diabetes_mellitus=True):
+        """synthetic rows in the raw file format, numbered from start"""
+        rng = np.random.default_rng(seed)
+        gdm = (rng.random(n) < self.params["gdm_rate"]).astype(np.int64)
+        data = pd.DataFrame(index=range(n))
+        for status in (0, 1):
+            rows = np.flatnonzero(gdm == status)
+            for var, values in self._sample_group(str(status), len(rows), rng).items():
+                if var not in data:
+                    data[var] = np.zeros(n, dtype=values.dtype)
+                data.loc[rows, var] = values
+
+        for var, decimals in self.params["decimals"].items():
+            data[var] = data[var].round(decimals)
+            if decimals == 0:
+                data[var] = data[var].astype(np.int64)
+        for var in gestational_ages:
+            data[var] = days_to_weeks_days(data[var].to_numpy())
+        data["number"] = np.arange(start, start + n)
+        data["gestational_dm"] = gdm
+        dm_rate = self.params["diabetes_mellitus_rate"] if diabetes_mellitus else 0.0
+        data["diabetes_mellitus"] = (rng.random(n) < dm_rate).astype(np.int64)
+
+        #missing values at the rates of the study file
+        for var, rate in self.params["missing_rates"].items():
+            data[var] = data[var].mask(rng.random(n) < rate)
+
+        data = data[self.params["clean_columns"]]
+        data.columns = self.params["raw_columns"]
+        return data
+
+    def generate_cleaned(self, n, seed=None, start=1):
+        """synthetic rows in the cleaned schema, from raw rows run through the cleaning pipeline
+
+        Participants with diabetes mellitus would be removed by the cleaning, so none are generated
+        and exactly n rows are returned.
+        """
+        raw = self.generate_raw(n, seed=seed, start=start, diabetes_mellitus=False)
+        imputer = new_imputer().partial_fit(raw.rename(columns=dict(zip(raw.columns, self.params["clean_columns"]))))
+        return apply_schema(clean_data(raw, imputer))
+
+    def generate_chunks(self, n, kind="raw", seed=None, chunksize=500_000):
+        """generate n rows in chunks, every chunk gets its own seed spawned from seed"""
+        sizes = [chunksize] * (n // chunksize) + ([n % chunksize] if n % chunksize else [])
+        generate = self.generate_raw if kind == "raw" else self.generate_cleaned
+        start = 1
+        for size, chunk_seed in zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))):
+            yield generate(size, seed=chunk_seed, start=start)
+            start += size
+
+
+def write_cohort(model, path, n, kind="raw", seed=123, chunksize=500_000):
+    """write a synthetic cohort to a csv (raw) or csv/parquet/feather (cleaned) file, returns the number of rows"""
+    n_rows = 0
+    if kind == "raw":
+        if not path.lower().endswith(".csv"):
+            raise ValueError(f"raw cohorts are written as csv, got {path}")
+        for chunk in model.generate_chunks(n, kind, seed, chunksize):
+            chunk.to_csv(path, index=False, mode="w" if n_rows == 0 else "a", header=n_rows == 0)
+            n_rows += len(chunk)
+        return n_rows
+    with CleanedWriter(path) as writer:
+        for chunk in model.generate_chunks(n, kind, seed, chunksize):
+            writer.write(chunk)
+            n_rows += len(chunk)
+    return n_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic cohort with the study's raw or cleaned schema.")
+    parser.add_argument("--rows", type=int, required=True, help="number of participants")
+    parser.add_argument("--kind", choices=["raw", "cleaned"], default="raw", help="raw csv or cleaned dataset")
+    parser.add_argument("--output", required=True, help="output file (.csv for raw, .parquet/.feather/.csv for cleaned)")
+    parser.add_argument("--source", default="datasets/visceral_fat_study.csv", help="raw study file the model is fitted on")
+    parser.add_argument("--seed", type=int, default=123, help="random seed")
+    parser.add_argument("--chunksize", type=int, default=500_000, help="rows generated at a time")
+    args = parser.parse_args(argv)
+
+    model = CohortModel.from_csv(args.source)
+    n_rows = write_cohort(model, args.output, args.rows, kind=args.kind, seed=args.seed, chunksize=args.chunksize)
+    print(f"Saved {n_rows} synthetic {args.kind} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
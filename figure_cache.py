@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from plotly.utils import PlotlyJSONEncoder
+
+
+#FIGURE CACHE
+#Every dropdown has a small set of options and the dashboard data only changes when the data file is reloaded,
+#so between reloads the same figures get rebuilt over and over by Plotly Express.
+#This cache stores each figure once as plain JSON-ready dicts, keyed by callback name + input values.
+#If a CallbackMetrics object is given, every call records its time (building vs serializing the figure),
+#json size and whether it was a cache hit.
+#If a version function is given (e.g. the modification time of the data file), its value is part of every key,
+#so a figure built from the previous data while the data is being reloaded is never served for the new data.
+#The app also clears the cache after each reload, so figures of the old data don't take up space.
+
+def _freeze(value):
+    """convert callback inputs (e.g. checklist lists) to hashable keys"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+class FigureCache:
+    """LRU cache of serialized figures, keyed by callback name and input values"""
+
+    def __init__(self, maxsize=2048, metrics=None, version=None):
+        self.maxsize = maxsize
+        self.metrics = metrics
+        self.version = version
+        self._store = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._store:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store.move_to_end(key)
+            return self._store[key]
+
+    def set(self, key, figure):
+        #serialize once with plotly's encoder so figures and numpy arrays become plain dicts/lists,
+        #Dash then only has to dump a plain dict on every response (also works for table data)
+        encoded = json.dumps(figure, cls=PlotlyJSONEncoder)
+        serialized = json.loads(encoded)
+        with self._lock:
+            self._store[key] = serialized
+            self._sizes[key] = len(encoded)
+            self._store.move_to_end(key)
+            #evict least recently used figures (e.g. rarely used heatmap checklist subsets)
+            while self.maxsize is not None and len(self._store) > self.maxsize:
+                evicted, _ = self._store.popitem(last=False)
+                self._sizes.pop(evicted, None)
+        return serialized
+
+    def size(self, key):
+        """size in bytes of the json of a cached figure"""
+        return self._sizes.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+            self._sizes.clear()
+
+    def reset_counts(self):
+        """start counting hits and misses again, e.g. after warming the cache"""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._store)
+
+    def cached(self, name):
+        """decorator for Dash callbacks, returns cached figure JSON for repeated inputs"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args):
+                start = time.perf_counter()
+                key = (name, self.version() if self.version else None, _freeze(args))
+                figure = self.get(key)
+                hit = figure is not None
+                compute = serialize = 0.0
+                if not hit:
+                    result = func(*args)
+                    compute = time.perf_counter() - start
+                    figure = self.set(key, result)
+                    serialize = time.perf_counter() - start - compute
+                if self.metrics is not None:
+                    self.metrics.observe(name, time.perf_counter() - start, compute=compute, serialize=serialize,
+                                         payload_bytes=self.size(key), cache_hit=hit)
+                return figure
+            wrapper.cache_name = name
+            return wrapper
+        return decorator
+
+    def warm(self, func, combinations):
+        """build and store figures for every combination of callback inputs"""
+        for args in combinations:
+            func(*args)
@@ -0,0 +1,95 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cohort_index import CohortIndex, SubsetCache
+
+
+#COHORT INDEX TESTS
+#The index masks are compared with the same filters written as plain pandas comparisons,
+#on random data with missing values in every column.
+
+n_rows = 1001
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({
+        "age": rng.integers(15, 45, n_rows).astype("float64"),
+        "weeks": rng.uniform(6, 32, n_rows),
+        "ethnicity": rng.choice(["Non-White", "White"], n_rows),
+        "pregnancies": rng.integers(1, 6, n_rows).astype("float64"),
+    })
+    for col in data.columns:
+        data.loc[rng.random(n_rows) < 0.1, col] = np.nan
+    return data
+
+@pytest.fixture(scope="module")
+def index(data):
+    return CohortIndex(data, ranges=["age", "weeks"], categories=["ethnicity", "pregnancies"])
+
+def pandas_mask(data, filters):
+    mask = pd.Series(True, index=data.index)
+    for col, selection in filters.items():
+        if col in ("age", "weeks"):
+            low, high = selection
+            mask &= data[col].between(-np.inf if low is None else low, np.inf if high is None else high)
+        else:
+            mask &= data[col].isin(selection)
+    return mask.to_numpy()
+
+
+@pytest.mark.parametrize("filters", [
+    #selections under and over half of the rows, the second one writes the complement
+    {"age": [20, 25]},
+    {"age": [17, 44]},
+    {"weeks": [6.5, 31.5]},
+    {"age": [None, 30]},
+    {"weeks": [12.0, None]},
+    {"age": [50, 60]},
+    #bitmaps, OR within a column and AND between columns
+    {"ethnicity": ["White"]},
+    {"pregnancies": [1.0, 3.0, 5.0]},
+    {"ethnicity": ["Non-White"], "pregnancies": [2.0, 4.0]},
+    {"ethnicity": ["White"], "pregnancies": [1.0, 2.0], "age": [18, 40], "weeks": [10.0, None]},
+    {"pregnancies": []},
+])
+def test_mask_matches_pandas(data, index, filters):
+    assert np.array_equal(index.mask(filters), pandas_mask(data, filters))
+
+def test_signature_mask_matches_filters(data, index):
+    filters = {"age": [18, 40], "ethnicity": ["White"]}
+    assert np.array_equal(index.mask(index.signature(filters)), pandas_mask(data, filters))
+
+def test_missing_values_sort_last(data, index):
+    values, order = index._sorted["age"]
+    n_valid = data["age"].notna().sum()
+    assert len(values) == n_valid
+    assert np.all(np.diff(values) >= 0)
+    assert data["age"].iloc[order[n_valid:]].isna().all()
+    assert index.range_bounds("age") == (data["age"].min(), data["age"].max())
+
+def test_full_range_signature_is_empty(data, index):
+    min_value, max_value = index.range_bounds("age")
+    assert index.signature({}) == ""
+    assert index.signature({"age": [min_value, max_value]}) == ""
+    assert index.signature({"age": [min_value - 5, max_value + 5]}) == ""
+    assert index.signature({"age": [None, None]}) == ""
+    assert index.signature({"ethnicity": ["White", "Non-White"], "pregnancies": None}) == ""
+    assert index.mask("").all()
+
+def test_signature_is_canonical(index):
+    min_value, _ = index.range_bounds("age")
+    signature = index.signature({"ethnicity": ["White"], "age": [min_value, 30]})
+    assert signature == index.signature({"age": [None, 30.0], "ethnicity": ["White", "Other"]})
+    assert json.loads(signature) == {"age": [None, 30.0], "ethnicity": ["White"]}
+
+def test_subset_cache_builds_each_signature_once(index):
+    builds = []
+    cache = SubsetCache(index, lambda mask: builds.append(mask) or int(mask.sum()), maxsize=2)
+    signatures = ["", index.signature({"ethnicity": ["White"]}), index.signature({"age": [20, 25]})]
+    sizes = [cache.get(signature) for signature in signatures + signatures[-1:]]
+    assert len(builds) == 3 and len(cache) == 2
+    assert sizes[0] == n_rows and sizes[-1] == sizes[-2]
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation import CorrelationEngine
+
+
+#CORRELATION ENGINE TESTS
+#The matrices are compared with pandas DataFrame.corr (pairwise deletion) on random correlated data
+#with missing values in every column.
+
+variables = ["a", "b", "c", "d", "e"]
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(1)
+    values = rng.multivariate_normal(np.arange(5) * 100.0, np.eye(5) + 0.6, size=500)
+    data = pd.DataFrame(values, columns=variables)
+    for col in variables:
+        data.loc[rng.random(len(data)) < 0.15, col] = np.nan
+    data["constant"] = 3.0
+    return data
+
+
+@pytest.mark.parametrize("method", CorrelationEngine.methods)
+def test_matrix_matches_pandas(data, method):
+    engine = CorrelationEngine(data, variables + ["constant"])
+    expected = data[variables + ["constant"]].corr(method=method)
+    pd.testing.assert_frame_equal(engine.subset(variables + ["constant"], method), expected, atol=1e-10)
+
+def test_subset_ignores_unselected_columns(data):
+    engine = CorrelationEngine(data, variables)
+    expected = data[["b", "d"]].corr()
+    pd.testing.assert_frame_equal(engine.subset(["b", "d"]), expected, atol=1e-10)
+
+def test_update_matches_pandas(data):
+    engine = CorrelationEngine(data.iloc[:200], variables)
+    engine.update(data.iloc[200:350])
+    engine.update(data.iloc[350:])
+    for method in CorrelationEngine.methods:
+        expected = data[variables].corr(method=method)
+        pd.testing.assert_frame_equal(engine.subset(variables, method), expected, atol=1e-10)